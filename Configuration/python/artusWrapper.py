@@ -5,6 +5,8 @@ import Artus.Utility.logger as logger
 log = logging.getLogger(__name__)
 
 import argparse
+import contextlib
+import cProfile
 import glob
 import os
 import sys
@@ -14,11 +16,13 @@ import json
 import shutil
 import subprocess
 import re
+import time
 from string import Template
 from datetime import datetime
 import ROOT
 
 import Artus.Utility.tools as tools
+import Artus.Utility.dcachetools as dcachetools
 import Artus.Utility.jsonTools as jsonTools
 import Artus.Utility.profile_cpp as profile_cpp
 
@@ -31,11 +35,15 @@ class ArtusWrapper(object):
 		self._executable = executable
 
 		self._parser = None
+		self._args = None
+		self._startupPhases = []
+		startTime = time.time()
 		#Load default argument parser
 		self._initArgumentParser(userArgParsers)
 		#Parse command line arguments and return dict
 		self._args = self._parser.parse_args()
 		logger.initLogger(self._args)
+		self._startupPhases.append({"phase" : "parse arguments", "time" : time.time()-startTime})
 
 		# expand the environment variables only at the batch node
 		if self._args.batch:
@@ -45,7 +53,8 @@ class ArtusWrapper(object):
 
 		# write repository revisions to the config
 		if not self._args.disable_repo_versions:
-			self.setRepositoryRevisions()
+			with self._startupPhase("repository revisions"):
+				self.setRepositoryRevisions()
 			self._config["Date"] = date_now
 
 		#Expand Config
@@ -66,17 +75,21 @@ class ArtusWrapper(object):
 		exitCode = 0
 
 		# save final config
-		if self._args.save_config:
-			self.saveConfig(self._args.save_config)
-		elif self._args.batch:
-			basename = "artus_config.json"
-			filepath = os.path.join(self.localProjectPath, basename)
-			if not os.path.exists(self.localProjectPath):
-				os.makedirs(self.localProjectPath)
-				os.makedirs(os.path.join(self.localProjectPath, "output"))
-			self.saveConfig(filepath)
-		else:
-			self.saveConfig()
+		with self._startupPhase("save config"):
+			if self._args.save_config:
+				self.saveConfig(self._args.save_config)
+			elif self._args.batch:
+				basename = "artus_config.json"
+				filepath = os.path.join(self.localProjectPath, basename)
+				if not os.path.exists(self.localProjectPath):
+					os.makedirs(self.localProjectPath)
+					os.makedirs(os.path.join(self.localProjectPath, "output"))
+				self.saveConfig(filepath)
+			else:
+				self.saveConfig()
+
+		if self._args.profile_startup:
+			self.reportStartupProfile(self._args.profile_startup)
 
 		if self._args.print_config:
 			log.info(self._config)
@@ -125,45 +138,66 @@ class ArtusWrapper(object):
 					dbsInput[key].append(first.strip())
 		return dbsInput
 
+	@staticmethod
+	def readProcessedFiles(job):
+		"""returns the input files of a grid-control job (job_*.txt), if it finished successfully"""
+		success = False
+		with open(job, "r") as jobinfo:
+			for line in jobinfo:
+				if "status" in line and "SUCCESS" in line:
+					success = True
+					break
+		if not success:
+			return []
+
+		job_gc = job.replace("/jobs/", "/output/").replace(".txt", "/gc.stdout")
+		if not os.path.exists(job_gc):
+			return []
+		with open(job_gc, "r") as gcfile:
+			for line in gcfile:
+				if "export FILE_NAMES" in line:
+					var, files = line.split("=", 1)
+					return files.strip().replace('\\', '').replace('"', '').split(", ")
+		return []
+
 	def removeProcessedFiles(self, dbs, path):
-		#import pdb
 		base_path, trash = os.path.split(path)
 		base_path = os.path.join(base_path, "workdir")
 		job_list = glob.glob(os.path.join(base_path, "jobs/job_*.txt"))
+
+		# the processed files per job are cached in an index file, that is updated
+		# for new jobs and for jobs, whose job info file changed since the last call
+		index_path = os.path.join(base_path, "processed_files_index.json")
+		index = {}
+		if os.path.exists(index_path):
+			try:
+				with open(index_path, "r") as index_file:
+					index = json.load(index_file)
+			except ValueError:
+				log.warning("Could not read index of processed files \"%s\". Rebuild it." % index_path)
+
+		updated_index = {}
+		processed_files = set()
 		for job in job_list:
-			with open(job, "r") as jobinfo:
-				parse_files = False
-				for line in jobinfo:
-					var, status = line.strip().split("=")
-					status = status.replace('"', '')
-					if "status" in line and "SUCCESS" in line:
-						parse_files = True
-						break
-			if parse_files:
-				job_gc = job.replace("/jobs/", "/output/").replace(".txt", "/gc.stdout")
-				files = ""
-				with open(job_gc, "r") as gcfile:
-					for line in gcfile:
-						if "export FILE_NAMES" in line:
-							var, files = line.split("=")
-							files = files.strip().replace('\\', '').replace('"', '')
-							files = files.split(", ")
-							break
-				main_key = ""
-				for key in dbs.keys():
-					#pdb.set_trace()
-					if re.search("kappa_%s_[0-9]+.root"%key, files[0]):
-						main_key = key
-						break
-				for sfile in files:
-					try:
-						ind = dbs[main_key].index(sfile)
-						dbs[main_key].pop(ind)
-					except ValueError:
-						continue
+			mtime = os.path.getmtime(job)
+			job_entry = index.get(job)
+			if (job_entry is None) or (job_entry[0] != mtime):
+				job_entry = [mtime, self.readProcessedFiles(job)]
+			updated_index[job] = job_entry
+			processed_files.update(job_entry[1])
+
+		if updated_index != index:
+			try:
+				with open(index_path+".tmp", "w") as index_file:
+					json.dump(updated_index, index_file)
+				os.rename(index_path+".tmp", index_path)
+			except (IOError, OSError):
+				log.warning("Could not write index of processed files \"%s\"." % index_path)
+
 		length = 0
-		for key, item in dbs.iteritems():
-			length += len(item)
+		for key in dbs.keys():
+			dbs[key] = [sfile for sfile in dbs[key] if not sfile in processed_files]
+			length += len(dbs[key])
 		log.info("Final dbs consists of %i files" %length)
 		return dbs
 
@@ -222,22 +256,33 @@ class ArtusWrapper(object):
 		scanDirs = tools.flattenList([glob.glob(scanDirWildcard) for scanDirWildcard in scanDirWildcards])
 		scanDirs = [scanDir for scanDir in scanDirs if os.path.isdir(scanDir)]
 
-		# key: directory to check type of repository
-		# value: command to extract the revision
-		repoVersionCommands = {
-			".git" : "git rev-parse HEAD",
-			".svn" : "svn info"# | grep Revision | awk '{print $2}'"
-		}
-		# loop over dirs and revision control systems and write revisions to the config dict
-		for repoDir, currentRevisionCommand in repoVersionCommands.items():
-			repoScanDirs = [os.path.join(scanDir, repoDir) for scanDir in scanDirs]
-			repoScanDirs = [glob.glob(os.path.join(scanDir, repoDir)) for scanDir in scanDirs]
+		# loop over dirs and revision control systems and collect the repositories
+		repositories = []
+		for repoDir in [".git", ".svn"]:
 			repoScanDirs = tools.flattenList([glob.glob(os.path.join(scanDir, repoDir)) for scanDir in scanDirs])
 			repoScanDirs = [os.path.abspath(os.path.join(repoScanDir, "..")) for repoScanDir in repoScanDirs]
-
-			for repoScanDir in repoScanDirs:
-				popenCout, popenCerr = subprocess.Popen(currentRevisionCommand.split(), stdout=subprocess.PIPE, cwd=repoScanDir).communicate()
-				self._config[repoScanDir] = popenCout.replace("\n", "")
+			repositories.extend([(repoScanDir, repoDir, self._args.repo_dirty_state) for repoScanDir in repoScanDirs])
+
+		# git revisions are read directly from the .git directories, only the remaining
+		# repositories need subprocesses, which are then run in parallel
+		results = []
+		subprocessRepositories = []
+		for repoScanDir, repoDir, checkDirty in repositories:
+			revision = tools.read_git_revision(repoScanDir) if repoDir == ".git" else None
+			if (revision is None) or checkDirty:
+				subprocessRepositories.append((repoScanDir, repoDir, checkDirty))
+			else:
+				results.append((repoScanDir, revision, None))
+		if len(subprocessRepositories) > 0:
+			results.extend(tools.parallelize(tools.get_repository_revision, subprocessRepositories,
+			                                 n_processes=self._args.repo_scan_n_processes,
+			                                 description="Determining repository revisions"))
+
+		# write revisions to the config dict
+		for repoScanDir, revision, dirty in results:
+			self._config[repoScanDir] = revision
+			if dirty:
+				self._config.setdefault("DirtyRepositories", []).append(repoScanDir)
 
 	def getConfig(self):
 		return self._config
@@ -293,20 +338,22 @@ class ArtusWrapper(object):
 	def expandConfig(self):
 
 		# merge all base configs into the main config
-		self._config += jsonTools.JsonDict.mergeAll(self._args.base_configs)
+		with self._startupPhase("merge base configs"):
+			self._config += jsonTools.JsonDict.mergeAll(self._args.base_configs)
 		self._gridControlInputFiles = {}
 
 		#Set Input Filenames
-		if self._args.input_files:
-			self._config["InputFiles"] = [] #overwrite settings from config file by command line
-			inputFileList = self._args.input_files
-			for entry in range(len(inputFileList)):
-				inputFileList[entry] = inputFileList[entry].replace('"', '').replace("'", '').replace(',', '')
-			self.setInputFilenames(self._args.input_files)
-		else:
-			tmpInputFiles = self._config["InputFiles"]
-			self._config["InputFiles"] = []
-			self.setInputFilenames(tmpInputFiles)
+		with self._startupPhase("setInputFilenames"):
+			if self._args.input_files:
+				self._config["InputFiles"] = [] #overwrite settings from config file by command line
+				inputFileList = self._args.input_files
+				for entry in range(len(inputFileList)):
+					inputFileList[entry] = inputFileList[entry].replace('"', '').replace("'", '').replace(',', '')
+				self.setInputFilenames(self._args.input_files)
+			else:
+				tmpInputFiles = self._config["InputFiles"]
+				self._config["InputFiles"] = []
+				self.setInputFilenames(tmpInputFiles)
 
 		if not self._args.n_events is None:
 			self._config["ProcessNEvents"] = self._args.n_events
@@ -320,55 +367,94 @@ class ArtusWrapper(object):
 			self.setOutputFilename(self._args.output_file)
 
 		# treat pipeline configs
-		pipelineJsonDict = {}
-		if self._args.pipeline_configs and len(self._args.pipeline_configs) > 0:
-			pipelineJsonDict = []
-			for pipelineConfigs in self._args.pipeline_configs:
-				pipelineJsonDict.append(jsonTools.JsonDict.expandAll(*map(lambda pipelineConfig: jsonTools.JsonDict.mergeAll(*pipelineConfig.split()), pipelineConfigs)))
-			pipelineJsonDict = jsonTools.JsonDict.mergeAll(*pipelineJsonDict)
-			pipelineJsonDict = jsonTools.JsonDict({"Pipelines": pipelineJsonDict})
-		pipelineJsonDict = jsonTools.JsonDict(pipelineJsonDict)
-
-		# treat pipeline base configs
-		pipelineBaseJsonDict = jsonTools.JsonDict()
-		if self._args.pipeline_base_configs and len(self._args.pipeline_base_configs) > 0:
-			pipelineBaseJsonDict = jsonTools.JsonDict({
-				"Pipelines" : {
-					pipeline : jsonTools.JsonDict(*self._args.pipeline_base_configs) for pipeline in pipelineJsonDict["Pipelines"].keys()
-				}
-			})
-
-		# merge resulting pipeline config into the main config
-		self._config += (pipelineBaseJsonDict + pipelineJsonDict)
+		with self._startupPhase("merge pipeline configs"):
+			pipelineJsonDict = {}
+			if self._args.pipeline_configs and len(self._args.pipeline_configs) > 0:
+				pipelineJsonDict = []
+				for pipelineConfigs in self._args.pipeline_configs:
+					pipelineJsonDict.append(jsonTools.JsonDict.expandAll(*map(lambda pipelineConfig: jsonTools.JsonDict.mergeAll(*pipelineConfig.split()), pipelineConfigs)))
+				pipelineJsonDict = jsonTools.JsonDict.mergeAll(*pipelineJsonDict)
+				pipelineJsonDict = jsonTools.JsonDict({"Pipelines": pipelineJsonDict})
+			pipelineJsonDict = jsonTools.JsonDict(pipelineJsonDict)
+
+			# treat pipeline base configs
+			pipelineBaseJsonDict = jsonTools.JsonDict()
+			if self._args.pipeline_base_configs and len(self._args.pipeline_base_configs) > 0:
+				pipelineBaseJsonDict = jsonTools.JsonDict({
+					"Pipelines" : {
+						pipeline : jsonTools.JsonDict(*self._args.pipeline_base_configs) for pipeline in pipelineJsonDict["Pipelines"].keys()
+					}
+				})
+
+			# merge resulting pipeline config into the main config
+			self._config += (pipelineBaseJsonDict + pipelineJsonDict)
 
 		# treat includes, nicks and comments
 		self.tmp_directory_remote_files = None
 		if self._args.batch:
-			self._config = self._config.doIncludes().doComments()
+			with self._startupPhase("includes/comments"):
+				self._config = self._config.doTransforms()
 			self._config["BatchMode"] = True
 		else:
 			nickname = self.determineNickname(self._args.nick)
 			log.debug("Prepare config for \""+nickname+"\" sample...")
-			self._config = self._config.doIncludes().doNicks(nickname).doComments()
+			with self._startupPhase("includes/nicks/comments"):
+				self._config = self._config.doTransforms(nick=nickname)
 			self._config["Nickname"] = nickname
 
 			#read in external values
-			self.readInExternals()
+			with self._startupPhase("readInExternals"):
+				self.readInExternals()
 
 		# remove all but one of similar pipeline copies
-		self.remove_pipeline_copies()
+		with self._startupPhase("remove_pipeline_copies"):
+			self.remove_pipeline_copies()
 
-		# treat environment variables
+		# treat environment variables (after readInExternals, such that external values are expanded as well)
 		if self._args.envvar_expansion:
-			self._config = self._config.doExpandvars()
+			with self._startupPhase("expandvars"):
+				self._config = self._config.doTransforms(includes=False, comments=False, expandvars=True)
 
 		# treat remote files
 		if self._args.copy_remote_files and (not self._args.batch):
-			self.useLocalCopiesOfRemoteFiles()
+			with self._startupPhase("remote file staging"):
+				self.useLocalCopiesOfRemoteFiles()
 
 		# set log level
 		self._config["LogLevel"] = self._args.log_level
 
+	@contextlib.contextmanager
+	def _startupPhase(self, name):
+		"""measure the duration of a startup phase (and profile it with cProfile if requested)"""
+		profiler = None
+		if self._args.profile_startup and self._args.profile_startup_cprofile:
+			profiler = cProfile.Profile()
+			profiler.enable()
+		startTime = time.time()
+		try:
+			yield
+		finally:
+			phase = {"phase" : name, "time" : time.time()-startTime}
+			if not profiler is None:
+				profiler.disable()
+				phase["cprofile"] = "%s_%s.prof" % (os.path.splitext(self._args.profile_startup)[0], re.sub("[^a-zA-Z0-9]+", "_", name))
+				profiler.dump_stats(phase["cprofile"])
+			self._startupPhases.append(phase)
+
+	def reportStartupProfile(self, filepath):
+		"""print the durations of the startup phases and save them to a JSON file"""
+		phases = sorted(self._startupPhases, key=lambda phase: phase["time"], reverse=True)
+		totalTime = sum([phase["time"] for phase in phases])
+		table = "Startup profile:\n%-30s %10s %7s\n" % ("phase", "time [s]", "[%]")
+		for phase in phases:
+			table += "%-30s %10.3f %7.1f\n" % (phase["phase"], phase["time"], 100.0 * phase["time"] / max(totalTime, 1e-9))
+		table += "%-30s %10.3f" % ("total", totalTime)
+		log.info(table)
+
+		with open(filepath, "w") as profileFile:
+			json.dump({"phases" : phases, "total" : totalTime}, profileFile, indent=4)
+		log.info("Saved startup profile \"%s\"." % filepath)
+
 	def determineNickname(self, nickname):
 		if nickname.find("auto") != -1: # automatic determination of nicknames
 			nickname = self.extractNickname(self._config["InputFiles"][0])
@@ -395,8 +481,20 @@ class ArtusWrapper(object):
 		if remote_identifiers is None:
 			remote_identifiers = ["dcap", "root"]
 
-		self.tmp_directory_remote_files = tempfile.mkdtemp(prefix="artus_remote_files_")
-		self._config = self._config.doReplaceFilesByLocalCopies(self.tmp_directory_remote_files, remote_identifiers)
+		start_time = time.time()
+		if self._args.remote_files_cache:
+			# persistent cache, which is reused by later runs and therefore not removed
+			cache_directory = os.path.expandvars(self._args.remote_files_cache)
+		else:
+			self.tmp_directory_remote_files = tempfile.mkdtemp(prefix="artus_remote_files_")
+			cache_directory = self.tmp_directory_remote_files
+		self._config = self._config.doReplaceFilesByLocalCopies(cache_directory, remote_identifiers,
+		                                                        n_processes=self._args.remote_files_n_processes,
+		                                                        verify=self._args.remote_files_verify)
+		
+		# limit the size of the persistent cache, keeping the files used in this run
+		if self._args.remote_files_cache and (self._args.remote_files_cache_size > 0):
+			dcachetools.prune_remote_files_cache(cache_directory, self._args.remote_files_cache_size * 1024**3, keep_newer_than=start_time)
 
 	def _initArgumentParser(self, userArgParsers=None):
 
@@ -432,6 +530,10 @@ class ArtusWrapper(object):
 		                                help="Base directories for repositories scan. [Default: $CMSSW_BASE/src/]")
 		configOptionsGroup.add_argument("--repo-scan-depth", required=False, type=int, default=3,
 		                                help="Depth of repositories scran. [Default: %(default)s]")
+		configOptionsGroup.add_argument("--repo-dirty-state", default=False, action="store_true",
+		                                help="Check repositories for uncommitted changes (calls git) and list them as DirtyRepositories in the JSON config.")
+		configOptionsGroup.add_argument("--repo-scan-n-processes", type=int, default=4,
+		                                help="Number of parallel processes for repository commands that cannot be avoided. [Default: %(default)s]")
 		configOptionsGroup.add_argument("--enable-envvar-expansion", dest="envvar_expansion", default=True, action="store_true",
 		                                help="Enable expansion of environment variables in config.")
 		configOptionsGroup.add_argument("--disable-envvar-expansion", dest="envvar_expansion", action="store_false",
@@ -458,12 +560,24 @@ class ArtusWrapper(object):
 		                                 help="Exit before running Artus to only check the configs.")
 		runningOptionsGroup.add_argument("--copy-remote-files", default=False, action="store_true",
 		                                 help="Copy remote files first to avoid too many open connections.")
+		runningOptionsGroup.add_argument("--remote-files-cache", default="",
+		                                 help="Directory for caching local copies of remote files between runs, e.g. \"%s\". By default (\"\"), temporary copies are made, which are removed after the run. [Default: %%(default)s]" % dcachetools.default_remote_files_cache())
+		runningOptionsGroup.add_argument("--remote-files-cache-size", type=float, default=50.0,
+		                                 help="Maximum size (in GB) of the directory given by --remote-files-cache. The least recently used files are removed after staging, files used in the current run are kept. Use 0 for no limit. [Default: %(default)s]")
+		runningOptionsGroup.add_argument("--remote-files-verify", default=False, action="store_true",
+		                                 help="Verify cached copies of remote files against the remote checksums (one request per file and run) and copy changed files again. By default, cached copies are reused without contacting the remote site.")
+		runningOptionsGroup.add_argument("--remote-files-n-processes", type=int, default=4,
+		                                 help="Number of parallel processes for copying remote files. [Default: %(default)s]")
 		runningOptionsGroup.add_argument("--ld-library-paths", nargs="+",
 		                                 help="Add paths to environment variable LD_LIBRARY_PATH.")
 		runningOptionsGroup.add_argument("--profile", default="",
 		                                 help="Measure performance with profiler. Choose igprof or valgrind.")
 		runningOptionsGroup.add_argument("--profile-options", default="pp",
 		                                 help="Additional options for profiling. Choose memory (mp) or performance (pp). [Default: %(default)s]")
+		runningOptionsGroup.add_argument("--profile-startup", default=None, const="artus_startup_profile.json", nargs="?",
+		                                 help="Measure the duration of the wrapper startup phases, print them and save them to a JSON file. [Default: %(const)s]")
+		runningOptionsGroup.add_argument("--profile-startup-cprofile", default=False, action="store_true",
+		                                 help="Additionally profile each startup phase with cProfile. The stats are saved next to the JSON file.")
 		runningOptionsGroup.add_argument("-r", "--root", default=False, action="store_true",
 		                                 help="Open output file in ROOT TBrowser after completion.")
 		runningOptionsGroup.add_argument("-b", "--batch", default=False, const="naf", nargs="?",
@@ -4,6 +4,8 @@ import logging
 import Artus.Utility.logger as logger
 log = logging.getLogger(__name__)
 
+import numpy
+
 import Artus.HarryPlotter.analysis_modules.histogrammanipulationbase as histogrammanipulationbase
 
 class AbsoluteBinContents(histogrammanipulationbase.HistogramManipulationBase):
@@ -20,6 +22,10 @@ class AbsoluteBinContents(histogrammanipulationbase.HistogramManipulationBase):
 		super(AbsoluteBinContents, self).prepare_args(parser, plotData)
 		self.whitelist = plotData.plotdict['absolute_bin_contents']
 
+	def _manipulate_arrays(self, contents, errors):
+		contents[self.global_bins] = numpy.abs(contents[self.global_bins])
+		return True
+
 	def _manipulate_bin(self, histogram, global_bin):
 		histogram.SetBinContent(global_bin, abs(histogram.GetBinContent(global_bin)))
 
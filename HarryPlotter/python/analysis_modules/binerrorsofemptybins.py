@@ -46,6 +46,11 @@ class BinErrorsOfEmptyBins(histogrammanipulationbase.HistogramManipulationBase):
 			return False
 		return super(BinErrorsOfEmptyBins, self)._selector(nick, root_histogram, plotData)
 
+	def _manipulate_arrays(self, contents, errors):
+		empty_bins = self.global_bins[contents[self.global_bins] == 0.0]
+		errors[empty_bins] = self.bin_error_for_empty_bins
+		return True
+
 	def _manipulate_bin(self, histogram, global_bin):
 		if histogram.GetBinContent(global_bin) == 0.0:
 			histogram.SetBinError(global_bin, self.bin_error_for_empty_bins)
@@ -8,8 +8,8 @@ import Artus.Utility.logger as logger
 log = logging.getLogger(__name__)
 
 import hashlib
+import numpy
 import ROOT
-import math
 
 import Artus.HarryPlotter.analysisbase as analysisbase
 import Artus.HarryPlotter.utility.roottools as roottools
@@ -41,15 +41,41 @@ class BlindingPolicy(analysisbase.AnalysisBase):
 		
 	@staticmethod
 	def get_blinding_expression(name):
-		if (name == "ams"): 
-			return lambda signal, background, parameter:  pow(2 * ((signal + background + parameter) * math.log1p( signal/(background+parameter)) - signal), 0.5) if((background + parameter) >0 ) else 0
+		"""
+		Blinding metric as function of numpy arrays of signal and background yields and the method parameter
+		"""
+		if (name == "ams"):
+			return BlindingPolicy.ams
 		elif (name == "soversqrtb"):
-			return lambda signal, background, parameter:  (signal / pow(background + pow(parameter*background, 2), 0.5)) if (background > 0) else 0.0
+			return BlindingPolicy.s_over_sqrt_b
 		elif (name == "soverb"):
-			return lambda signal, background, parameter: signal / background
+			return BlindingPolicy.s_over_b
 		else:
 			log.fatal("invalid blinding method string selected: " + name)
 	
+	@staticmethod
+	def ams(signal, background, parameter):
+		"""Approximate median significance with regularisation parameter, 0 for non-positive regularised background"""
+		regularised_background = background + parameter
+		valid = (regularised_background > 0)
+		safe_background = numpy.where(valid, regularised_background, 1.0)
+		with numpy.errstate(invalid="ignore"):
+			result = numpy.sqrt(2 * ((signal + safe_background) * numpy.log1p(signal / safe_background) - signal))
+		return numpy.where(valid, result, 0.0)
+	
+	@staticmethod
+	def s_over_sqrt_b(signal, background, parameter):
+		"""s/sqrt(b + (epsilon*b)^2), 0 for empty background"""
+		valid = (background > 0)
+		safe_background = numpy.where(valid, background, 1.0)
+		return numpy.where(valid, signal / numpy.sqrt(safe_background + numpy.square(parameter * safe_background)), 0.0)
+	
+	@staticmethod
+	def s_over_b(signal, background, parameter):
+		"""s/b, 0 for empty background"""
+		valid = (background != 0)
+		return numpy.where(valid, signal / numpy.where(valid, background, 1.0), 0.0)
+	
 	def run(self, plotData=None):
 		super(BlindingPolicy, self).run(plotData)
 
@@ -65,13 +91,25 @@ class BlindingPolicy(analysisbase.AnalysisBase):
 			background = roottools.RootTools.add_root_histograms(*[plotData.plotdict["root_objects"][nick] for nick in background_nick.split(" ")])
 			expression = self.get_blinding_expression(method)
 
-			if(signal.GetNbinsX() != background.GetNbinsX()):
-				log.fatal("Signal histogram " + signal + " has a different binning than " + background )
+			if (signal.GetDimension() != background.GetDimension()) or (signal.GetNcells() != background.GetNcells()):
+				log.fatal("Signal histogram " + signal.GetName() + " has a different binning than " + background.GetName())
 
-			for x_bin in xrange(1, signal.GetNbinsX()+1):
-				new_histogram.SetBinContent(x_bin, expression( signal.GetBinContent(x_bin), background.GetBinContent(x_bin), regularization_parameter) )
-				log.debug("bin: {bin}\tsig: {sig}\tbkg:{bkg}".format(bin=x_bin, sig=signal.GetBinContent(x_bin), bkg=background.GetBinContent(x_bin)))
+			global_bins = roottools.RootTools.get_global_bins_array(signal)
+			signal_contents = roottools.RootTools.get_bin_contents_array(signal)
+			background_contents = roottools.RootTools.get_bin_contents_array(background)
+			new_contents = roottools.RootTools.get_bin_contents_array(new_histogram)
+			new_contents[global_bins] = expression(signal_contents[global_bins], background_contents[global_bins], regularization_parameter)
+			if log.isEnabledFor(logging.DEBUG):
+				for global_bin in global_bins:
+					log.debug("bin: {bin}\tsig: {sig}\tbkg:{bkg}".format(bin=global_bin, sig=signal_contents[global_bin], bkg=background_contents[global_bin]))
+			
+			if roottools.RootTools.has_bin_arrays(new_histogram):
+				entries = new_histogram.GetEntries()
+				new_histogram.SetContent(new_contents)
+				new_histogram.SetEntries(entries)
+			else:
+				for global_bin in global_bins:
+					new_histogram.SetBinContent(int(global_bin), new_contents[global_bin])
 
 			plotData.plotdict["root_objects"][result_nick] = new_histogram
 			plotData.plotdict["nicks"].append(result_nick)
-
@@ -36,6 +36,12 @@ class ConstBinContentsMin(histogrammanipulationbase.HistogramManipulationBase):
 		self.histogram_min = root_histogram.GetMinimum(0.0)
 		return super(ConstBinContentsMin, self)._selector(nick, root_histogram, plotData)
 	
+	def _manipulate_arrays(self, contents, errors):
+		non_empty_bins = self.global_bins[contents[self.global_bins] != 0.0]
+		contents[non_empty_bins] = self.histogram_min
+		errors[non_empty_bins] = 0.0
+		return True
+	
 	def _manipulate_bin(self, histogram, global_bin):
 		if histogram.GetBinContent(global_bin) != 0.0:
 			histogram.SetBinContent(global_bin, self.histogram_min)
@@ -8,6 +8,7 @@ import ROOT
 
 import array
 import hashlib
+import numpy
 import sys
 
 import Artus.HarryPlotter.analysis_modules.histogrammanipulationbase as histogrammanipulationbase
@@ -135,6 +136,16 @@ class ContourFromHistogram(histogrammanipulationbase.HistogramManipulationBase):
 						log.debug("Retrived contour \"%s\" for threshold %f from histogram \"%s\"." % (contour_graph_nick, contour_threshold, histogram_nick))
 
 
+	def _selector(self, nick, root_histogram, plotData):
+		if isinstance(root_histogram, ROOT.TH1):
+			self.histogram_max = root_histogram.GetMaximum()
+		return super(ContourFromHistogram, self)._selector(nick, root_histogram, plotData)
+
+	def _manipulate_arrays(self, contents, errors):
+		empty_bins = self.global_bins[(contents[self.global_bins] == 0.0) & (errors[self.global_bins] == 0.0)]
+		contents[empty_bins] = self.histogram_max
+		return True
+
 	def _manipulate_bin(self, histogram, global_bin):
 		if (histogram.GetBinContent(global_bin) == 0.0) and (histogram.GetBinError(global_bin) == 0.0):
 			histogram.SetBinContent(global_bin, histogram.GetMaximum())
@@ -160,6 +171,24 @@ class ContourFromHistogram(histogrammanipulationbase.HistogramManipulationBase):
 			"""
 
 	def _manipulate_boundary_bins(self, histogram):
+		if roottools.RootTools.has_bin_arrays(histogram):
+			# copy the contents of the closest inner bins to the under- and overflow bins
+			# by padding the inner bins with their edge values
+			n_bins = [histogram.GetNbinsZ(), histogram.GetNbinsY(), histogram.GetNbinsX()][3-histogram.GetDimension():]
+			shape = [n_axis_bins+2 for n_axis_bins in n_bins]
+			inner_bins = tuple([slice(1, -1)] * len(shape))
+			
+			contents = roottools.RootTools.get_bin_contents_array(histogram)
+			errors = roottools.RootTools.get_bin_errors_array(histogram, contents)
+			new_contents = numpy.pad(contents.reshape(shape)[inner_bins], 1, mode="edge").ravel()
+			new_errors = numpy.pad(errors.reshape(shape)[inner_bins], 1, mode="edge").ravel()
+			
+			entries = histogram.GetEntries()
+			histogram.SetContent(new_contents)
+			histogram.SetError(new_errors)
+			histogram.SetEntries(entries)
+			return
+		
 		for x_bin in xrange(0, histogram.GetNbinsX()+2):
 			next_x_bin = x_bin + (1 if x_bin == 0 else (-1 if x_bin > histogram.GetNbinsX() else 0))
 			for y_bin in xrange(0, histogram.GetNbinsY()+2):
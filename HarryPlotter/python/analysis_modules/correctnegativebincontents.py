@@ -38,10 +38,29 @@ class CorrectNegativeBinContents(histogrammanipulationbase.HistogramManipulation
 	def _selector(self, nick, root_histogram, plotData):
 		if isinstance(root_histogram, ROOT.TH1):
 			self.original_integral = root_histogram.Integral()
+			self.has_sumw2 = (root_histogram.GetSumw2N() > 0)
 		else:
 			return False
 		return super(CorrectNegativeBinContents, self)._selector(nick, root_histogram, plotData)
 	
+	def _manipulate_arrays(self, contents, errors):
+		if not self.has_sumw2:
+			# errors of corrected bins depend on the order of the per-bin manipulation
+			return False
+		
+		negative_bins = self.global_bins[contents[self.global_bins] < 0.0]
+		if len(negative_bins) > 0:
+			contents[negative_bins] = 0.0
+			
+			# preserve original integral
+			# (equivalent to scaling after each corrected bin)
+			new_integral = contents[self.global_bins].sum()
+			if new_integral > 0.0:
+				scale_factor = abs(self.original_integral / new_integral)
+				contents *= scale_factor
+				errors *= scale_factor
+		return True
+	
 	def _manipulate_bin(self, histogram, global_bin):
 		if histogram.GetBinContent(global_bin) < 0.0:
 			histogram.SetBinContent(global_bin, 0.0)
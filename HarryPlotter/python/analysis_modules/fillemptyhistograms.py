@@ -46,6 +46,11 @@ class FillEmptyHistograms(histogrammanipulationbase.HistogramManipulationBase):
 		else:
 			return False
 	
+	def _manipulate_arrays(self, contents, errors):
+		contents[self.global_bins] = self.bin_content
+		errors[self.global_bins] = self.bin_error
+		return True
+	
 	def _manipulate_bin(self, histogram, global_bin):
 		histogram.SetBinContent(global_bin, self.bin_content)
 		histogram.SetBinError(global_bin, self.bin_error)
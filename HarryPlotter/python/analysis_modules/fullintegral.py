@@ -45,6 +45,11 @@ class FullIntegral(analysisbase.AnalysisBase):
 		if plotData.plotdict["full_integral_task"] == "int_to_histogram":
 			self.remove_options(parser, ["--x-bins", "--labels", "--colors", "--scale_factors", "--legend-markers", "--nicks"])
 
+	@staticmethod
+	def integral(histogram):
+		"""Sum of the contents of the global bins 1 to NbinsX from the content buffer"""
+		return float(roottools.RootTools.get_bin_contents_array(histogram)[1:histogram.GetNbinsX()+1].sum())
+
 	def run(self, plotData=None):
 		super(FullIntegral, self).run(plotData)
 		outpath = os.path.expandvars(plotData.plotdict["full_integral_outputs"][0])
@@ -61,10 +66,7 @@ class FullIntegral(analysisbase.AnalysisBase):
 				  except:
 				      print "!!! Can't add",nick,"to the full integral"
 				signal = roottools.RootTools.add_root_histograms(*[plotData.plotdict["root_objects"][nick] for nick in goodnicks])
-				integral = 0
-				for x_bin in xrange(1, signal.GetNbinsX()+1):
-					#log.info("access bin %i"%x_bin)
-					integral += signal.GetBinContent(x_bin)
+				integral = FullIntegral.integral(signal)
 
 				dirpath, filename = os.path.split(outpath)
 				if not os.path.isdir(dirpath):
@@ -80,10 +82,7 @@ class FullIntegral(analysisbase.AnalysisBase):
 			integral_nicks = []
 			#print plotData.plotdict.get("root_objects", {})
 			for nick, histogram in plotData.plotdict.get("root_objects", {}).iteritems():
-				integral = 0
-				for x_bin in xrange(1, histogram.GetNbinsX()+1):
-					#log.info("access bin %i"%x_bin)
-					integral += histogram.GetBinContent(x_bin)
+				integral = FullIntegral.integral(histogram)
 				integral_values.append(integral)
 				integral_nicks.append(nick)
 				#delete and reassign to get rid of those nasty root objects without disturbing pythons iterator
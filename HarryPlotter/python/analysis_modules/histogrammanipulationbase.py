@@ -4,7 +4,10 @@ import logging
 import Artus.Utility.logger as logger
 log = logging.getLogger(__name__)
 
+import numpy
+
 import Artus.HarryPlotter.analysisbase as analysisbase
+import Artus.HarryPlotter.utility.roottools as roottools
 
 class HistogramManipulationBase(analysisbase.AnalysisBase):
 	"""Base class for histogram-manipulation processors."""
@@ -18,6 +21,9 @@ class HistogramManipulationBase(analysisbase.AnalysisBase):
 
 		for nick, root_histogram in plotData.plotdict["root_objects"].iteritems():
 			if self._selector(nick, root_histogram, plotData):
+				if self._manipulate_histogram_arrays(root_histogram):
+					continue
+				
 				for x_bin in xrange(1, root_histogram.GetNbinsX()+1):
 					for y_bin in xrange(1, root_histogram.GetNbinsY()+1):
 						for z_bin in xrange(1, root_histogram.GetNbinsZ()+1):
@@ -32,5 +38,38 @@ class HistogramManipulationBase(analysisbase.AnalysisBase):
 		else:
 			return False
 
+	def _manipulate_histogram_arrays(self, histogram):
+		"""
+		Manipulate all bins at once via _manipulate_arrays.
+		Returns False if the per-bin fallback (_manipulate_bin) needs to be used.
+		"""
+		if not roottools.RootTools.has_bin_arrays(histogram):
+			return False
+		
+		# bins that are visited by the per-bin loop
+		self.global_bins = roottools.RootTools.get_global_bins_array(histogram)
+		original_contents = roottools.RootTools.get_bin_contents_array(histogram)
+		original_errors = roottools.RootTools.get_bin_errors_array(histogram, original_contents)
+		contents = original_contents.copy()
+		errors = original_errors.copy()
+		if not self._manipulate_arrays(contents, errors):
+			return False
+		
+		if not numpy.array_equal(contents, original_contents):
+			entries = histogram.GetEntries()
+			histogram.SetContent(contents)
+			histogram.SetEntries(entries)
+		if not numpy.array_equal(errors, original_errors):
+			histogram.SetError(errors)
+		return True
+
+	def _manipulate_arrays(self, contents, errors):
+		"""
+		Manipulate the bin contents and errors of all global bins (including under- and overflow bins) in place.
+		self.global_bins contains the bins to be manipulated.
+		Returns True if the manipulation is implemented, otherwise the per-bin fallback is used.
+		"""
+		return False
+
 	def _manipulate_bin(self, histogram, global_bin):
 		pass
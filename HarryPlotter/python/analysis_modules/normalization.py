@@ -4,9 +4,12 @@ import logging
 import Artus.Utility.logger as logger
 log = logging.getLogger(__name__)
 
+import numpy
+
 import ROOT
 
 import Artus.HarryPlotter.analysisbase as analysisbase
+import Artus.HarryPlotter.utility.roottools as roottools
 
 
 class NormalizeByBinWidth(analysisbase.AnalysisBase):
@@ -55,6 +58,46 @@ class NormalizeToUnity(analysisbase.AnalysisBase):
 				if root_histogram.Integral() != 0.0:
 					root_histogram.Scale(1.0 / root_histogram.Integral())
 
+def normalize_th2_to_unity(root_histogram, axis):
+	"""
+	Normalize the bin contents of a TH2 histogram along one axis to unity (under- and overflow bins are ignored).
+	axis = 0: sum over all rows in each column, axis = 1: sum over all columns in each row
+	The errors are propagated in quadrature, including the uncertainty of the sums. Empty rows/columns remain unchanged.
+	"""
+	n_bins_x = root_histogram.GetNbinsX()
+	n_bins_y = root_histogram.GetNbinsY()
+	contents = roottools.RootTools.get_bin_contents_array(root_histogram)
+	errors = roottools.RootTools.get_bin_errors_array(root_histogram, contents)
+	
+	# global bin = x_bin + (n_bins_x+2) * y_bin
+	inner_contents = contents.reshape(n_bins_y+2, n_bins_x+2)[1:-1, 1:-1]
+	inner_squared_errors = numpy.square(errors.reshape(n_bins_y+2, n_bins_x+2)[1:-1, 1:-1])
+	sums = inner_contents.sum(axis=axis, keepdims=True)
+	squared_errors_sums = inner_squared_errors.sum(axis=axis, keepdims=True)
+	
+	non_empty = (sums != 0.0)
+	safe_sums = numpy.where(sums != 0.0, sums, 1.0)
+	normalized_contents = inner_contents / safe_sums
+	normalized_errors = numpy.sqrt(
+			(numpy.square(safe_sums - inner_contents) * inner_squared_errors) +
+			(numpy.square(inner_contents) * (squared_errors_sums - inner_squared_errors))
+	) / numpy.square(safe_sums)
+	
+	new_contents = contents.copy()
+	new_errors = errors.copy()
+	new_contents.reshape(n_bins_y+2, n_bins_x+2)[1:-1, 1:-1] = numpy.where(non_empty, normalized_contents, inner_contents)
+	new_errors.reshape(n_bins_y+2, n_bins_x+2)[1:-1, 1:-1] = numpy.where(non_empty, normalized_errors, numpy.sqrt(inner_squared_errors))
+	
+	if roottools.RootTools.has_bin_arrays(root_histogram):
+		entries = root_histogram.GetEntries()
+		root_histogram.SetContent(new_contents)
+		root_histogram.SetError(new_errors)
+		root_histogram.SetEntries(entries)
+	else:
+		for global_bin in roottools.RootTools.get_global_bins_array(root_histogram):
+			root_histogram.SetBinContent(int(global_bin), new_contents[global_bin])
+			root_histogram.SetBinError(int(global_bin), new_errors[global_bin])
+
 class NormalizeColumnsToUnity(analysisbase.AnalysisBase):
 	"""In a TH2 histo, normalize each column such that sum(rows) = 1."""
 	def __init__(self):
@@ -66,14 +109,7 @@ class NormalizeColumnsToUnity(analysisbase.AnalysisBase):
 		for nick, root_histogram in plotData.plotdict["root_objects"].iteritems():
 			if isinstance(root_histogram, ROOT.TH2):
 				root_histogram.Sumw2()
-				sumBinContentColumn = 0
-				for iBinX in range(1, root_histogram.GetNbinsX()+1):
-					for iBinY in range(1, root_histogram.GetNbinsY()+1):
-						sumBinContentColumn += root_histogram.GetBinContent(iBinX, iBinY)
-					for iBinY in range(1, root_histogram.GetNbinsY()+1):
-						binContent = root_histogram.GetBinContent(iBinX, iBinY)
-						root_histogram.SetBinContent(iBinX, iBinY, binContent/sumBinContentColumn)
-					sumBinContentColumn = 0
+				normalize_th2_to_unity(root_histogram, axis=0)
 
 class NormalizeRowsToUnity(analysisbase.AnalysisBase):
 	"""In a TH2 histo, normalize each row such that sum(columns) = 1."""
@@ -86,14 +122,7 @@ class NormalizeRowsToUnity(analysisbase.AnalysisBase):
 		for nick, root_histogram in plotData.plotdict["root_objects"].iteritems():
 			if isinstance(root_histogram, ROOT.TH2):
 				root_histogram.Sumw2()
-				sumBinContentRow = 0
-				for iBinY in range(1, root_histogram.GetNbinsY()+1):
-					for iBinX in range(1, root_histogram.GetNbinsX()+1):
-						sumBinContentRow += root_histogram.GetBinContent(iBinX, iBinY)
-					for iBinX in range(1, root_histogram.GetNbinsX()+1):
-						binContent = root_histogram.GetBinContent(iBinX, iBinY)
-						root_histogram.SetBinContent(iBinX, iBinY, binContent/sumBinContentRow)
-					sumBinContentRow = 0
+				normalize_th2_to_unity(root_histogram, axis=1)
 
 
 class NormalizeHistogram(analysisbase.AnalysisBase):
@@ -9,10 +9,12 @@ import array
 import copy
 import hashlib
 import math
+import numpy
 
 import ROOT
 
 import Artus.HarryPlotter.analysisbase as analysisbase
+import Artus.HarryPlotter.utility.roottools as roottools
 import Artus.Utility.tools as tools
 
 class PValue(analysisbase.AnalysisBase):
@@ -69,34 +71,38 @@ class PValue(analysisbase.AnalysisBase):
 			print index, p_value_null_hypothesis_nick, p_value_alternative_hypothesis_nick
 			null_hypothesis_histogramm=plotData.plotdict["root_objects"][p_value_null_hypothesis_nick]
 			alternative_hypothesis_histogramm=plotData.plotdict["root_objects"][p_value_alternative_hypothesis_nick]
-			q_obs=plotData.plotdict["root_objects"][p_value_observed_nick].GetX()[0]
+			observed_graph=plotData.plotdict["root_objects"][p_value_observed_nick]
+			
+			# all points of the observed graph are treated as observed q values
+			q_obs_values=numpy.array(numpy.ndarray(observed_graph.GetN(), dtype=numpy.double, buffer=observed_graph.GetX()))
+			q_obs=q_obs_values[0]
 
-			plotData.plotdict["root_objects"][p_value_observed_nick].SetPoint(plotData.plotdict["root_objects"][p_value_observed_nick].GetN(), q_obs,alternative_hypothesis_histogramm.GetMaximum())	
+			observed_graph.SetPoint(observed_graph.GetN(), q_obs,alternative_hypothesis_histogramm.GetMaximum())	
 			#print q_obs		
 	
-			null_hypothesis_integral_full=null_hypothesis_histogramm.Integral()
+			null_hypothesis_integral_full, null_hypothesis_integrals_toq, null_hypothesis_integrals_fromq = PValue.tail_integrals(null_hypothesis_histogramm, q_obs_values)
 			#print null_hypothesis_integral_full
 
-			alternative_hypothesis_integral_full=alternative_hypothesis_histogramm.Integral()
+			alternative_hypothesis_integral_full, alternative_hypothesis_integrals_toq, alternative_hypothesis_integrals_fromq = PValue.tail_integrals(alternative_hypothesis_histogramm, q_obs_values)
 			#print alternative_hypothesis_integral_full
-			alternative_hypothesis_integral_fromq=alternative_hypothesis_histogramm.Integral(alternative_hypothesis_histogramm.FindBin(q_obs),alternative_hypothesis_histogramm.GetNbinsX()+1)
 
-			null_hypothesis_integral_fromq=null_hypothesis_histogramm.Integral(0,null_hypothesis_histogramm.FindBin(q_obs))
+			pvalues1=alternative_hypothesis_integrals_fromq/alternative_hypothesis_integral_full
+			pvalues2=null_hypothesis_integrals_toq/null_hypothesis_integral_full
 
-			#print alternative_hypothesis_integral_fromq
-			pvalue1=alternative_hypothesis_integral_fromq/alternative_hypothesis_integral_full
-			print "pvalue=", pvalue1
+			for q_obs, pvalue1, pvalue2 in zip(q_obs_values, pvalues1, pvalues2):
+				if len(q_obs_values) > 1:
+					print "q_obs=", q_obs
+				print "pvalue=", pvalue1
 
-			significance_in_sigma1 = tools.pvalue2sigma(pvalue1)
+				significance_in_sigma1 = tools.pvalue2sigma(pvalue1)
 
-			print "sigmas1	= ", significance_in_sigma1
+				print "sigmas1	= ", significance_in_sigma1
 
-			pvalue2=null_hypothesis_integral_fromq/null_hypothesis_integral_full
-			print "pvalue2=", pvalue2
+				print "pvalue2=", pvalue2
 
-			significance_in_sigma2 = tools.pvalue2sigma(pvalue2)
+				significance_in_sigma2 = tools.pvalue2sigma(pvalue2)
 
-			print "sigmas2=", significance_in_sigma2
+				print "sigmas2=", significance_in_sigma2
 
 		"""
 			PValue_graph_name = "histogram_" + hashlib.md5("_".join([plotData.plotdict["root_objects"][PValue_numerator_nick].GetName(),
@@ -111,5 +117,22 @@ class PValue(analysisbase.AnalysisBase):
 			plotData.plotdict["root_objects"][PValue_nick] = PValue_graph
 		"""
 
-
-
+	@staticmethod
+	def tail_integrals(histogram, q_values):
+		"""
+		Integrals of a 1D histogram for many q values, computed from one cumulative sum of the bin contents
+		
+		returns (integral over all bins without under- and overflow,
+		         integrals from the underflow bin to the bin containing q (inclusive),
+		         integrals from the bin containing q to the overflow bin (inclusive))
+		"""
+		n_bins = histogram.GetNbinsX()
+		cumulative_contents = numpy.concatenate(([0.0], numpy.cumsum(roottools.RootTools.get_bin_contents_array(histogram)[:n_bins+2])))
+		
+		# same as FindBin: 0 for underflow, n_bins+1 for overflow
+		q_bins = numpy.searchsorted(numpy.array(roottools.RootTools.get_binning(histogram)), q_values, side="right")
+		
+		integral_full = cumulative_contents[n_bins+1] - cumulative_contents[1]
+		integrals_toq = cumulative_contents[q_bins+1]
+		integrals_fromq = cumulative_contents[n_bins+2] - cumulative_contents[q_bins]
+		return integral_full, integrals_toq, integrals_fromq
@@ -5,11 +5,10 @@ import Artus.Utility.logger as logger
 log = logging.getLogger(__name__)
 
 import hashlib
+import numpy
 
 import ROOT
 
-from math import sqrt, pow
-
 import Artus.HarryPlotter.analysisbase as analysisbase
 import Artus.HarryPlotter.utility.roottools as roottools
 import Artus.HarryPlotter.analysis_modules.scaleerrors as scaleerrors
@@ -64,6 +63,7 @@ class Ratio(analysisbase.AnalysisBase):
 	def run(self, plotData=None):
 		super(Ratio, self).run(plotData)
 		
+		denominator_histograms = {}
 		for ratio_numerator_nicks, ratio_numerator_no_errors, ratio_denominator_nicks, ratio_denominator_no_errors, ratio_result_nick in zip(
 				*[plotData.plotdict[k] for k in ["ratio_numerator_nicks", "ratio_numerator_no_errors", "ratio_denominator_nicks", "ratio_denominator_no_errors", "ratio_result_nicks"]]
 		):
@@ -83,58 +83,28 @@ class Ratio(analysisbase.AnalysisBase):
 			if ratio_numerator_no_errors:
 				scaleerrors.ScaleErrors.scale_errors(numerator_histogram)
 			
-			denominator_histogram = None
-			for nick in ratio_denominator_nicks:
-				root_object = plotData.plotdict["root_objects"][nick]
-				if denominator_histogram is None:
-					denominator_histogram = root_object.Clone(
-							"ratio_denominator_" + hashlib.md5("_".join([str(ratio_numerator_nicks), str(ratio_denominator_nicks), ratio_result_nick])).hexdigest()
-					)
-				else:
-					denominator_histogram.Add(root_object)
-				if hasattr(denominator_histogram, "SetDirectory"):
-					denominator_histogram.SetDirectory(0)
-			
-			if ratio_denominator_no_errors:
-				scaleerrors.ScaleErrors.scale_errors(denominator_histogram)
+			# summed denominators are reused for ratios with the same denominator
+			denominator_key = (tuple(ratio_denominator_nicks), ratio_denominator_no_errors)
+			denominator_histogram = denominator_histograms.get(denominator_key, None)
+			if denominator_histogram is None:
+				for nick in ratio_denominator_nicks:
+					root_object = plotData.plotdict["root_objects"][nick]
+					if denominator_histogram is None:
+						denominator_histogram = root_object.Clone(
+								"ratio_denominator_" + hashlib.md5("_".join([str(ratio_numerator_nicks), str(ratio_denominator_nicks), ratio_result_nick])).hexdigest()
+						)
+					else:
+						denominator_histogram.Add(root_object)
+					if hasattr(denominator_histogram, "SetDirectory"):
+						denominator_histogram.SetDirectory(0)
+				
+				if ratio_denominator_no_errors:
+					scaleerrors.ScaleErrors.scale_errors(denominator_histogram)
+				denominator_histograms[denominator_key] = denominator_histogram
 			
 			# calculate ratio
 			if isinstance(numerator_histogram, ROOT.TGraph) and isinstance(denominator_histogram, ROOT.TGraph):
-				if isinstance(numerator_histogram, ROOT.TGraphAsymmErrors) and isinstance(denominator_histogram, ROOT.TGraphAsymmErrors):
-					ratio_histogram = ROOT.TGraphAsymmErrors()
-				elif isinstance(numerator_histogram, ROOT.TGraphErrors) and isinstance(denominator_histogram, ROOT.TGraphErrors):
-					ratio_histogram = ROOT.TGraphErrors()
-				else:
-					ratio_histogram = ROOT.TGraph()
-				successful_division = True
-				for point in range(0,numerator_histogram.GetN()):
-					x_value = ROOT.Double(0)
-					y_value_numerator = ROOT.Double(0)
-					numerator_histogram.GetPoint(point, x_value, y_value_numerator)
-					y_value_denominator = denominator_histogram.Eval(x_value)
-					if y_value_denominator != 0.:
-						ratio_histogram.SetPoint(point, x_value, y_value_numerator/y_value_denominator)
-						if isinstance(ratio_histogram, ROOT.TGraphAsymmErrors):
-							x_err_high = numerator_histogram.GetErrorXhigh(point)
-							x_err_low = numerator_histogram.GetErrorXlow(point)
-							y_err_high_numerator = numerator_histogram.GetErrorYhigh(point)
-							y_err_high_denominator = denominator_histogram.GetErrorYhigh(point)
-							y_err_low_numerator = numerator_histogram.GetErrorYlow(point)
-							y_err_low_denominator = denominator_histogram.GetErrorYlow(point)
-							y_err_high_ratio = sqrt(pow(y_err_high_numerator/y_value_denominator,2) + pow(y_value_numerator*y_err_high_denominator,2)/pow(y_value_denominator,4))
-							y_err_low_ratio = sqrt(pow(y_err_low_numerator/y_value_denominator,2) + pow(y_value_numerator*y_err_low_denominator,2)/pow(y_value_denominator,4))
-							ratio_histogram.SetPointEXhigh(point, x_err_high)
-							ratio_histogram.SetPointEXlow(point, x_err_low)
-							ratio_histogram.SetPointEYhigh(point, y_err_high_ratio)
-							ratio_histogram.SetPointEYlow(point, y_err_low_ratio)
-						elif isinstance(ratio_histogram, ROOT.TGraphErrors):
-							x_err = numerator_histogram.GetErrorX(point)
-							y_err_numerator = numerator_histogram.GetErrorY(point)
-							y_err_denominator = denominator_histogram.GetErrorY(point)
-							y_err_ratio = sqrt(pow(y_err_numerator/y_value_denominator,2) + pow(y_value_numerator*y_err_denominator,2)/pow(y_value_denominator,4))
-							ratio_histogram.SetPointError(point, x_err, y_err_ratio)
-					else:
-						successful_division = False
+				ratio_histogram, successful_division = Ratio.divide_graphs(numerator_histogram, denominator_histogram)
 			else:
 				ratio_histogram = roottools.RootTools.to_histogram(numerator_histogram)
 				successful_division = ratio_histogram.Divide(roottools.RootTools.to_histogram(denominator_histogram))
@@ -148,3 +118,73 @@ class Ratio(analysisbase.AnalysisBase):
 			ratio_histogram.SetTitle("")
 			plotData.plotdict["root_objects"][ratio_result_nick] = ratio_histogram
 
+	@staticmethod
+	def divide_graphs(numerator_graph, denominator_graph):
+		"""
+		Divide two graphs point by point using numpy views of their buffers.
+		
+		The denominator is evaluated at the x values of the numerator (directly taken from its buffer if the x values are identical).
+		Errors of TGraphErrors and TGraphAsymmErrors are propagated in quadrature, separately for low and high errors.
+		Points with vanishing denominator are set to zero (trailing ones are removed).
+		
+		returns (ratio graph, True if all points could be divided)
+		"""
+		n_points = numerator_graph.GetN()
+		n_denominator_points = denominator_graph.GetN()
+		
+		def view(buffer, n):
+			return numpy.ndarray(n, dtype=numpy.double, buffer=buffer) if n > 0 else numpy.zeros(0)
+		
+		def denominator_errors(buffer):
+			# errors of points not existing in the denominator are -1 (as returned by GetErrorY)
+			errors = numpy.full(n_points, -1.0)
+			n_common = min(n_points, n_denominator_points)
+			errors[:n_common] = view(buffer, n_denominator_points)[:n_common]
+			return errors
+		
+		x_values = view(numerator_graph.GetX(), n_points)
+		y_values_numerator = view(numerator_graph.GetY(), n_points)
+		if (n_points == n_denominator_points) and numpy.array_equal(view(denominator_graph.GetX(), n_points), x_values):
+			y_values_denominator = view(denominator_graph.GetY(), n_points)
+		else:
+			y_values_denominator = numpy.array([denominator_graph.Eval(x_value) for x_value in x_values], dtype=numpy.double)
+		
+		valid = (y_values_denominator != 0.0)
+		n_ratio_points = (numpy.flatnonzero(valid)[-1] + 1) if numpy.any(valid) else 0
+		safe_y_values_denominator = numpy.where(valid, y_values_denominator, 1.0)
+		
+		def ratio_values(values):
+			return numpy.ascontiguousarray(numpy.where(valid, values, 0.0)[:n_ratio_points])
+		
+		def ratio_errors(errors_numerator, errors_denominator):
+			return ratio_values(numpy.sqrt(
+					numpy.square(errors_numerator / safe_y_values_denominator) +
+					numpy.square(y_values_numerator * errors_denominator) / numpy.power(safe_y_values_denominator, 4)
+			))
+		
+		ratio_x_values = ratio_values(x_values)
+		ratio_y_values = ratio_values(y_values_numerator / safe_y_values_denominator)
+		
+		if isinstance(numerator_graph, ROOT.TGraphAsymmErrors) and isinstance(denominator_graph, ROOT.TGraphAsymmErrors):
+			graph_class = ROOT.TGraphAsymmErrors
+			graph_args = [
+					ratio_values(view(numerator_graph.GetEXlow(), n_points)),
+					ratio_values(view(numerator_graph.GetEXhigh(), n_points)),
+					ratio_errors(view(numerator_graph.GetEYlow(), n_points), denominator_errors(denominator_graph.GetEYlow())),
+					ratio_errors(view(numerator_graph.GetEYhigh(), n_points), denominator_errors(denominator_graph.GetEYhigh())),
+			]
+		elif isinstance(numerator_graph, ROOT.TGraphErrors) and isinstance(denominator_graph, ROOT.TGraphErrors):
+			graph_class = ROOT.TGraphErrors
+			graph_args = [
+					ratio_values(view(numerator_graph.GetEX(), n_points)),
+					ratio_errors(view(numerator_graph.GetEY(), n_points), denominator_errors(denominator_graph.GetEY())),
+			]
+		else:
+			graph_class = ROOT.TGraph
+			graph_args = []
+		
+		if n_ratio_points > 0:
+			ratio_graph = graph_class(int(n_ratio_points), ratio_x_values, ratio_y_values, *graph_args)
+		else:
+			ratio_graph = graph_class()
+		return ratio_graph, bool(numpy.all(valid))
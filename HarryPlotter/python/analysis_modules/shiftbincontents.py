@@ -23,5 +23,9 @@ class ShiftBinContents(histogrammanipulationbase.HistogramManipulationBase):
 		self.whitelist = plotData.plotdict['shift_bin_contents']
 		self.shift = plotData.plotdict['shift']
 
+	def _manipulate_arrays(self, contents, errors):
+		contents[self.global_bins] += self.shift
+		return True
+
 	def _manipulate_bin(self, histogram, global_bin):
 		histogram.SetBinContent(global_bin, histogram.GetBinContent(global_bin) + self.shift)
@@ -5,7 +5,7 @@ import Artus.Utility.logger as logger
 log = logging.getLogger(__name__)
 import sys
 
-import hashlib
+import numpy
 
 import ROOT
 
@@ -55,29 +55,27 @@ class SOverBRebinning(analysisbase.AnalysisBase):
 			nbinsX = plotData.plotdict["root_objects"][signal_nick].GetNbinsX()
 			log.debug( signal_nick, " / ", background_nick, " / ", data_nick )
 
-			for xbin in range(1,nbinsX,1):
-				signal = plotData.plotdict["root_objects"][signal_nick].GetBinContent(xbin)
-				signal_e = plotData.plotdict["root_objects"][signal_nick].GetBinError(xbin)
-				bkg = plotData.plotdict["root_objects"][background_nick].GetBinContent(xbin)
-				bkg_e = plotData.plotdict["root_objects"][background_nick].GetBinError(xbin)
-				data = plotData.plotdict["root_objects"][data_nick].GetBinContent(xbin)
-				data_e = plotData.plotdict["root_objects"][data_nick].GetBinError(xbin)
-				sb = signal / (signal+bkg)
-				if sb < binning[0]:
-					sb = binning[0]
-				current_bin = signal_histo.FindBin(sb)
-
-				signal_histo.SetBinContent(current_bin, signal+signal_histo.GetBinContent(current_bin))
-				signal_histo.SetBinError(current_bin, signal_e+signal_histo.GetBinError(current_bin))
-
-				bkg_histo.SetBinContent(current_bin, bkg+bkg_histo.GetBinContent(current_bin))
-				bkg_histo.SetBinError(current_bin, bkg_e+bkg_histo.GetBinError(current_bin))
-
-				data_histo.SetBinContent(current_bin, data+data_histo.GetBinContent(current_bin))
-				data_histo.SetBinError(current_bin, data_e+data_histo.GetBinError(current_bin))
-
-				if (sb > 0.1):
-					print data_nick, " : ", sb, ", content: ", data, ", bin: ", xbin, ", signal:", signal, " bg: ", bkg
+			# contents and errors of the global bins 1 to nbinsX-1
+			input_bins = slice(1, nbinsX)
+			contents = {}
+			errors = {}
+			for nick in [signal_nick, background_nick, data_nick]:
+				bin_contents = roottools.RootTools.get_bin_contents_array(plotData.plotdict["root_objects"][nick])
+				contents[nick] = bin_contents[input_bins]
+				errors[nick] = roottools.RootTools.get_bin_errors_array(plotData.plotdict["root_objects"][nick], bin_contents)[input_bins]
+
+			# s/(s+b) of all input bins and their target bins (same as FindBin)
+			total = contents[signal_nick] + contents[background_nick]
+			sb = numpy.maximum(numpy.where(total != 0.0, contents[signal_nick] / numpy.where(total != 0.0, total, 1.0), 0.0), binning[0])
+			target_bins = numpy.searchsorted(binning, sb, side="right")
+
+			# bin contents and errors are summed up (linearly) for each target bin
+			for histogram, nick in zip([signal_histo, bkg_histo, data_histo], [signal_nick, background_nick, data_nick]):
+				histogram.SetContent(numpy.bincount(target_bins, weights=contents[nick], minlength=len(binning)+1).astype(numpy.double))
+				histogram.SetError(numpy.bincount(target_bins, weights=errors[nick], minlength=len(binning)+1).astype(numpy.double))
+
+			for index in numpy.flatnonzero(sb > 0.1):
+				print data_nick, " : ", sb[index], ", content: ", contents[data_nick][index], ", bin: ", index+1, ", signal:", contents[signal_nick][index], " bg: ", contents[background_nick][index]
 			
 			plotData.plotdict["nicks"].append(rebinned_name + "_s")
 			plotData.plotdict["nicks"].append(rebinned_name + "_b")
@@ -85,40 +83,3 @@ class SOverBRebinning(analysisbase.AnalysisBase):
 			plotData.plotdict["root_objects"][rebinned_name + "_s"] = signal_histo
 			plotData.plotdict["root_objects"][rebinned_name + "_b"] = bkg_histo
 			plotData.plotdict["root_objects"][rebinned_name + "_data"] = data_histo
-
-
-			name_hash = hashlib.md5("_".join([str(signal_nicks), str(background_nicks), str(rebinning_nicks)])).hexdigest()
-			
-			signal_histogram = None
-			for signal_nick in signal_nicks:
-				if signal_histogram is None:
-					signal_histogram = plotData.plotdict["root_objects"][signal_nick].Clone("signal_"+name_hash)
-				else:
-					signal_histogram.Add(plotData.plotdict["root_objects"][signal_nick])
-			
-			background_histogram = None
-			for background_nick in background_nicks:
-				if background_histogram is None:
-					background_histogram = plotData.plotdict["root_objects"][background_nick].Clone("background_"+name_hash)
-				else:
-					background_histogram.Add(plotData.plotdict["root_objects"][background_nick])
-			
-			s_over_b_histogram = signal_histogram.Clone("ratio_"+name_hash)
-			s_over_b_histogram.Divide(background_histogram)
-			
-			s_over_b_ratios = []
-			for x_bin in xrange(1, s_over_b_histogram.GetNbinsX()+1):
-				for y_bin in xrange(1, s_over_b_histogram.GetNbinsY()+1):
-					for z_bin in xrange(1, s_over_b_histogram.GetNbinsZ()+1):
-						global_bin = s_over_b_histogram.GetBin(x_bin, y_bin, z_bin)
-						s_over_b_ratios.append((global_bin, s_over_b_histogram.GetBinContent(global_bin)))
-			s_over_b_ratios.sort(key=lambda item: item[1], reverse=False)
-			
-			for rebinning_nick in rebinning_nicks:
-				histogram = plotData.plotdict["root_objects"][rebinning_nick]
-				rebinned_histogram = ROOT.TH1D("histogram_"+name_hash, "", len(s_over_b_ratios), 0.0, float(len(s_over_b_ratios)))
-				for index, global_bin in enumerate(zip(*s_over_b_ratios)[0]):
-					rebinned_histogram.SetBinContent(index+1, histogram.GetBinContent(global_bin))
-					rebinned_histogram.SetBinError(index+1, histogram.GetBinError(global_bin))
-				plotData.plotdict["root_objects"][rebinning_nick] = rebinned_histogram
-
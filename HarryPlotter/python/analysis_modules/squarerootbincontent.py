@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import math
+import numpy
 
 import logging
 import Artus.Utility.logger as logger
@@ -22,6 +23,13 @@ class SquareRootBinContent(histogrammanipulationbase.HistogramManipulationBase):
 		super(SquareRootBinContent, self).prepare_args(parser, plotData)
 		self.whitelist = plotData.plotdict['square_root_nicks']
 
+	def _manipulate_arrays(self, contents, errors):
+		if numpy.any(contents[self.global_bins] < 0.0):
+			# let the per-bin implementation fail for negative bin contents
+			return False
+		contents[self.global_bins] = numpy.sqrt(contents[self.global_bins])
+		return True
+
 	def _manipulate_bin(self, histogram, global_bin):
 		histogram.SetBinContent(global_bin, math.sqrt(histogram.GetBinContent(global_bin)))
 
@@ -4,11 +4,12 @@ import logging
 import Artus.Utility.logger as logger
 log = logging.getLogger(__name__)
 
-import array
+import numpy
 
 import ROOT
 
 import Artus.HarryPlotter.analysisbase as analysisbase
+import Artus.HarryPlotter.utility.roottools as roottools
 
 
 class StatisticalErrors(analysisbase.AnalysisBase):
@@ -45,51 +46,59 @@ class StatisticalErrors(analysisbase.AnalysisBase):
 			root_object_new = plotData.plotdict["root_objects"][nick].Clone(newnick)
 			plotData.plotdict['nicks'].append(newnick)
 			if isinstance(root_object, ROOT.TH1) and not isinstance(root_object, ROOT.TProfile):
-				for x_bin in xrange(1, root_object.GetNbinsX()+1):
-					for y_bin in xrange(1, root_object.GetNbinsY()+1):
-						for z_bin in xrange(1, root_object.GetNbinsZ()+1):
-							global_bin = root_object.GetBin(x_bin, y_bin, z_bin)
-							root_object_new.SetBinContent(global_bin, StatisticalErrors.rel_error(
-									root_object.GetBinContent(global_bin),
-									root_object.GetBinError(global_bin),
-									relative=plotData.plotdict["stat_error_relative"],
-									percent=plotData.plotdict["stat_error_relative_percent"]
-							))
-							root_object_new.SetBinError(global_bin, 0.0)
-				plotData.plotdict['root_objects'][newnick] = root_object_new
-			
-			elif isinstance(root_object, ROOT.TGraph) and (not isinstance(root_object, ROOT.TGraph2D)):
-				has_errors = isinstance(root_object, ROOT.TGraphErrors)
-				has_asymm_errors = isinstance(root_object, ROOT.TGraphAsymmErrors)
-				for point in xrange(root_object.GetN()):
-					x_value, y_value = array.array("d", [0.0]), array.array("d", [0.0])
-					root_object.GetPoint(point, x_value, y_value)
-					x_value = x_value[0]
-					y_value = y_value[0]
-					
-					x_error_high = root_object.GetErrorXhigh(point)
-					x_error_low = root_object.GetErrorXlow(point)
-					y_error_high = root_object.GetErrorYhigh(point)
-					y_error_low = root_object.GetErrorYlow(point)
-					
-					y_rel_error_high = StatisticalErrors.rel_error(
-							y_value,
-							y_error_high,
+				if roottools.RootTools.has_bin_arrays(root_object):
+					global_bins = roottools.RootTools.get_global_bins_array(root_object)
+					contents = roottools.RootTools.get_bin_contents_array(root_object)
+					errors = roottools.RootTools.get_bin_errors_array(root_object, contents)
+					new_contents = contents.copy()
+					new_contents[global_bins] = StatisticalErrors.rel_errors(
+							contents[global_bins],
+							errors[global_bins],
 							relative=plotData.plotdict["stat_error_relative"],
 							percent=plotData.plotdict["stat_error_relative_percent"]
 					)
-					y_rel_error_low = StatisticalErrors.rel_error(
-							y_value,
-							y_error_low,
+					errors[global_bins] = 0.0
+					root_object_new.SetContent(new_contents)
+					root_object_new.SetError(errors)
+				else:
+					for x_bin in xrange(1, root_object.GetNbinsX()+1):
+						for y_bin in xrange(1, root_object.GetNbinsY()+1):
+							for z_bin in xrange(1, root_object.GetNbinsZ()+1):
+								global_bin = root_object.GetBin(x_bin, y_bin, z_bin)
+								root_object_new.SetBinContent(global_bin, StatisticalErrors.rel_error(
+										root_object.GetBinContent(global_bin),
+										root_object.GetBinError(global_bin),
+										relative=plotData.plotdict["stat_error_relative"],
+										percent=plotData.plotdict["stat_error_relative_percent"]
+								))
+								root_object_new.SetBinError(global_bin, 0.0)
+				plotData.plotdict['root_objects'][newnick] = root_object_new
+			
+			elif isinstance(root_object, ROOT.TGraph) and (not isinstance(root_object, ROOT.TGraph2D)):
+				n_points = root_object.GetN()
+				if n_points == 0:
+					continue
+				y_values = numpy.ndarray(n_points, dtype=numpy.double, buffer=root_object.GetY())
+				
+				if isinstance(root_object, ROOT.TGraphAsymmErrors):
+					for y_errors in [root_object.GetEYlow(), root_object.GetEYhigh()]:
+						y_errors = numpy.ndarray(n_points, dtype=numpy.double, buffer=y_errors)
+						y_errors[:] = StatisticalErrors.rel_errors(
+								y_values,
+								y_errors,
+								relative=plotData.plotdict["stat_error_relative"],
+								percent=plotData.plotdict["stat_error_relative_percent"]
+						)
+				elif isinstance(root_object, ROOT.TGraphErrors):
+					y_errors = numpy.ndarray(n_points, dtype=numpy.double, buffer=root_object.GetEY())
+					y_errors[:] = StatisticalErrors.rel_errors(
+							y_values,
+							y_errors,
 							relative=plotData.plotdict["stat_error_relative"],
 							percent=plotData.plotdict["stat_error_relative_percent"]
 					)
-					
-					root_object.SetPoint(point, x_value, 0.0)
-					if has_asymm_errors:
-						root_object.SetPointError(point, x_error_low, x_error_high, y_rel_error_low, y_rel_error_high)
-					elif has_errors:
-						root_object.SetPointError(point, x_error_high, y_rel_error_high)
+				
+				y_values[:] = 0.0
 			
 			else:
 				log.warning("Module \"{name}\" does not support object of type \"{object_type}\" (nick \"{nick}\"".format(
@@ -104,4 +113,12 @@ class StatisticalErrors(analysisbase.AnalysisBase):
 		if relative and (central != 0.0):
 			result /= central
 		return (result*100. if percent else result)
-
+	
+	@staticmethod
+	def rel_errors(centrals, errors, relative=False, percent=False):
+		"""Vectorised version of rel_error for numpy arrays."""
+		results = numpy.array(errors, dtype=numpy.double)
+		if relative:
+			non_zero = (centrals != 0.0)
+			results[non_zero] /= centrals[non_zero]
+		return (results*100. if percent else results)
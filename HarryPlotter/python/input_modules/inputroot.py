@@ -7,6 +7,7 @@ import logging
 import Artus.Utility.logger as logger
 log = logging.getLogger(__name__)
 
+import collections
 import hashlib
 import os
 import sys
@@ -61,6 +62,8 @@ class InputRoot(inputfile.InputFile):
 		
 		self.input_options.add_argument("--tree-draw-options", nargs='+', type=str, default="",
 		                                help="Optional argument for TTree:Draw() call. Use e.g. \"prof\" or \"profs\" for projections of 2D-Histograms to 1D. See also http://root.cern.ch/ooot/html/TTree.html#TTree:Draw. Specify \"TGraph\" for plotting y- vs. x-values into a TGraph. \"TGraphErrors\" leads to a graph with errors by specifying inputs with --x-expressions <x values>:<x errors> --y-expressions <y values>:<y errors>. \"TGraphAsymmErrorsX\" leads to a graph with asymmetric x-errors by specifying inputs with --x-expressions <x values>:<x errors (down)>:<x errors (up)> --y-expressions <y values>. \"TGraphAsymmErrorsY\" leads to a graph with asymmetric y-errors by specifying inputs with --x-expressions <x values> --y-expressions <y values>:<y errors (down)>:<y errors (up)>. \"TGraph2D\" leads to a 2D graph by specifying inputs with --x-expressions <x values> --y-expressions <y values> --z-expressions <z values>. ROOT.TTree.MakeProxy and ROOT.TTree.Process is usued to fill the histograms from a tree instead of ROOT.TTree.Draw or ROOT.TTree.Project in case you specify the option \"proxy\" This is needed e.g. for formulas containing two branches/leafs with different non-fundamental types.")
+		self.input_options.add_argument("--read-n-processes", type=int, default=1,
+		                                help="Number of processes reading histograms from independent ROOT files in parallel. [Default: %(default)s]")
 		self.input_options.add_argument("--proxy-prefix", type=str, default=None,
 		                                help="Additional C++ code (e.g. include statements) to be put in the proxy macros. [Default: %(default)s]")
 		
@@ -92,6 +95,26 @@ class InputRoot(inputfile.InputFile):
 		root_tools = roottools.RootTools()
 		self.hide_progressbar = plotData.plotdict["hide_progressbar"]
 		del(plotData.plotdict["hide_progressbar"])
+		
+		# histograms of all inputs are read in one go, opening each file only once
+		root_folder_types = []
+		file_histogram_requests = collections.OrderedDict()
+		for index, (root_files, folders, x_expression) in enumerate(zip(
+				plotData.plotdict["files"],
+				plotData.plotdict["folders"],
+				[self.expressions.replace_expressions(expression) for expression in plotData.plotdict["x_expressions"]]
+		)):
+			# check whether to read from TTree or from TDirectory
+			root_folder_types.append(roottools.RootTools.check_type(root_files, folders,
+			                                                        print_quantities=plotData.plotdict["quantities"]))
+			if (root_folder_types[-1] == "TDirectory") and (not x_expression is None):
+				root_objects = [os.path.join(folder, x_expression) for folder in folders]
+				file_histogram_requests[index] = (root_files, root_objects, roottools.RootTools.file_histogram_name(root_files, root_objects))
+		file_histograms = dict(zip(
+				file_histogram_requests.keys(),
+				roottools.RootTools.histograms_from_files(file_histogram_requests.values(), n_processes=plotData.plotdict["read_n_processes"])
+		))
+		
 		for index, (
 				root_files,
 				folders,
@@ -123,9 +146,7 @@ class InputRoot(inputfile.InputFile):
 				plotData.plotdict["friend_aliases"],
 				plotData.plotdict["tree_draw_options"]
 		), description="Reading ROOT inputs", visible=not self.hide_progressbar )):
-			# check whether to read from TTree or from TDirectory
-			root_folder_type = roottools.RootTools.check_type(root_files, folders,
-			                                                  print_quantities=plotData.plotdict["quantities"])
+			root_folder_type = root_folder_types[index]
 			root_tree_chain = None
 			root_histogram = None
 			
@@ -150,15 +171,12 @@ class InputRoot(inputfile.InputFile):
 				if x_expression is None:
 					log.error('No x_expression provided.')
 					sys.exit(1)
-				root_objects = [os.path.join(folder, x_expression) for folder in folders]
-				
-				root_histogram = roottools.RootTools.histogram_from_file(
-						root_files,
-						root_objects,
+				root_histogram = roottools.RootTools.rebin_file_histogram(
+						file_histograms[index],
 						x_bins=x_bins,
 						y_bins=y_bins,
 						z_bins=z_bins,
-						name=None)
+						name=file_histogram_requests[index][2])
 				if hasattr(root_histogram, "Sumw2"):
 					root_histogram.Sumw2()
 			else:
@@ -13,6 +13,7 @@ import copy
 import collections
 import glob
 import hashlib
+import math
 import numpy
 import os
 import sys
@@ -117,12 +118,13 @@ class RootTools(object):
 
 
 	@staticmethod
-	def histogram_from_file(root_file_names, path_to_histograms, x_bins=None, y_bins=None, z_bins=None, name=None):
+	def histogram_from_file(root_file_names, path_to_histograms, x_bins=None, y_bins=None, z_bins=None, name=None, n_processes=1):
 		"""
 		Read histograms from files
 	
 		root_file_names: string (or list of strings)
 		path_to_histograms: string (or list of strings) of path to root histogram in root file
+		n_processes: number of processes reading independent files in parallel
 	
 		This function looks for the same histograms in all files and sums them up
 		The name (string) of the resulting histogram can be passed as a parameter
@@ -135,39 +137,78 @@ class RootTools(object):
 	
 		# prepare unique histogram name
 		if name == None:
-			name = "histogram_{0}.json".format(hashlib.md5("_".join([str(root_file_names),
-				                                                     str(path_to_histograms)])).hexdigest())
+			name = RootTools.file_histogram_name(root_file_names, path_to_histograms)
 	
-		# loop over files and try to read histograms
-		root_histogram = None
-		for root_file_name in root_file_names:
-			with TFileContextManager(root_file_name, "READ") as root_file:
+		root_histogram = RootTools.histograms_from_files([(root_file_names, path_to_histograms, name)], n_processes=n_processes)[0]
+		return RootTools.rebin_file_histogram(root_histogram, x_bins=x_bins, y_bins=y_bins, z_bins=z_bins, name=name)
+
+
+	@staticmethod
+	def file_histogram_name(root_file_names, path_to_histograms):
+		"""
+		Unique name of a histogram summed up from files by histogram_from_file
+		"""
+		if isinstance(root_file_names, basestring):
+			root_file_names = [root_file_names]
+		if isinstance(path_to_histograms, basestring):
+			path_to_histograms = [path_to_histograms]
+		return "histogram_{0}.json".format(hashlib.md5("_".join([str(root_file_names),
+		                                                         str(path_to_histograms)])).hexdigest())
+
+
+	@staticmethod
+	def histograms_from_files(requests, n_processes=1):
+		"""
+		Read histograms for several requests at once
+		
+		requests: list of (root_file_names, path_to_histograms, name) tuples
+		n_processes: number of processes reading independent groups of files in parallel
+		
+		Each file is opened only once and all histograms requested from it are read in one go.
+		The histograms of each request are summed up over all its files and paths.
+		Returns the list of summed histograms in the order of the requests.
+		"""
+		names = []
+		file_requests = collections.OrderedDict()
+		for request_index, (root_file_names, path_to_histograms, name) in enumerate(requests):
+			if isinstance(root_file_names, basestring):
+				root_file_names = [root_file_names]
+			if isinstance(path_to_histograms, basestring):
+				path_to_histograms = [path_to_histograms]
+			names.append(name)
+			for root_file_name in root_file_names:
 				for path_to_histogram in path_to_histograms:
-                                        tmp_root_histogram = None
-                                        for k in root_file.GetListOfKeys():
-                                            if path_to_histogram == k.GetName():
-                                                tmp_root_histogram = root_file.Get(k.GetName())
-                                                break
-                                        if tmp_root_histogram == None:
-                                            tmp_root_histogram = root_file.Get(path_to_histogram)
-					if tmp_root_histogram == None:
-						log.critical("Cannot find histogram \"%s\" in file \"%s\"!" % (path_to_histogram, root_file_name))
-						sys.exit(1)
-				
-					if tmp_root_histogram is None:
-						log.error("Could not find histogram \"" + path_to_histogram + "\" in file \"" + root_file_name + "\"!")
-					else:
-						if isinstance(tmp_root_histogram, ROOT.TH1):
-							tmp_root_histogram.SetDirectory(0)
-					
-						if root_histogram == None:
-							root_histogram = tmp_root_histogram.Clone(name)
-						else:
-							root_histogram.Add(tmp_root_histogram)
-					
-						if isinstance(root_histogram, ROOT.TH1):
-							root_histogram.SetDirectory(0)
+					file_requests.setdefault(root_file_name, []).append((request_index, path_to_histogram))
+		
+		# contiguous groups of files keep the order of the summation
+		file_requests = file_requests.items()
+		n_groups = max(1, min(n_processes, len(file_requests)))
+		group_size = int(math.ceil(float(len(file_requests)) / n_groups)) if len(file_requests) > 0 else 1
+		arguments = [(file_requests[index:index+group_size], names) for index in xrange(0, len(file_requests), group_size)]
+		results = tools.parallelize(_sum_histograms_from_files, arguments, n_processes=n_processes, description="Reading histograms")
+		
+		root_histograms = [None] * len(requests)
+		for partial_histograms, missing in results:
+			if not missing is None:
+				log.critical("Cannot find histogram \"%s\" in file \"%s\"!" % missing)
+				sys.exit(1)
+			for request_index, partial_histogram in partial_histograms.iteritems():
+				if root_histograms[request_index] is None:
+					root_histograms[request_index] = partial_histogram
+				else:
+					root_histograms[request_index].Add(partial_histogram)
+		
+		for root_histogram in root_histograms:
+			if isinstance(root_histogram, ROOT.TH1):
+				root_histogram.SetDirectory(0)
+		return root_histograms
 
+
+	@staticmethod
+	def rebin_file_histogram(root_histogram, x_bins=None, y_bins=None, z_bins=None, name=None):
+		"""
+		Rebin a histogram read from file according to the binning arguments of histogram_from_file
+		"""
 		# rebinning
 		if isinstance(root_histogram, ROOT.TH1) and root_histogram.GetNbinsX()*root_histogram.GetNbinsY()*root_histogram.GetNbinsZ() > 1:
 			rebinning_x = 1
@@ -546,10 +587,15 @@ class RootTools(object):
 			tmp_root_histogram.RebinZ(simpleRebinning[2])
 	
 		# complex rebinning (non-constant bin widths)
-		rebinned_root_histogram = tmp_root_histogram.Clone(name)
+		# aligned bin edges are merged in place in the (already cloned) temporary histogram
+		rebinned_root_histogram = tmp_root_histogram
+		if any(complexRebinning.values()) and RootTools._rebin_aligned_root_histogram(tmp_root_histogram, complexRebinning):
+			complexRebinning = {}
+		
 		if any(complexRebinning.values()):
 	
 			# create exmpty histogram with correct final binning
+			rebinned_root_histogram = tmp_root_histogram.Clone(name)
 			rebinned_root_histogram.Reset()
 		
 			complexRebinning = { axisNumber : rebinning if rebinning else RootTools.get_binning(rebinned_root_histogram, axisNumber)
@@ -631,6 +677,76 @@ class RootTools(object):
 		return rebinned_root_histogram
 
 
+	@staticmethod
+	def _rebin_aligned_root_histogram(root_histogram, complexRebinning):
+		"""
+		Rebin a histogram in place to new bin edges that are a subset of the existing ones
+		by summing up contents and sums of squared weights with numpy.add.reduceat along each axis.
+		
+		Old bins outside the new range are added to the new under- and overflow bins.
+		Returns False without modifying the histogram if this is not possible (profiles, non-aligned bin edges).
+		"""
+		if not RootTools.has_bin_arrays(root_histogram):
+			return False
+		
+		dimension = root_histogram.GetDimension()
+		new_bin_edges = []
+		reduce_starts = []
+		for axisNumber in xrange(dimension):
+			bin_edges = RootTools.get_binning(root_histogram, axisNumber)
+			new_bin_edges.append(array.array("d", complexRebinning[axisNumber]) if complexRebinning[axisNumber] else bin_edges)
+			edge_indices = RootTools.get_edge_indices(bin_edges, new_bin_edges[-1])
+			if edge_indices is None:
+				return False
+			reduce_starts.append(numpy.concatenate(([0], edge_indices+1)))
+		
+		# numpy shape: (z, y, x) including under- and overflow bins
+		shape = [len(RootTools.get_binning(root_histogram, axisNumber))+1 for axisNumber in reversed(xrange(dimension))]
+		contents = RootTools.get_bin_contents_array(root_histogram).reshape(shape)
+		sumw2 = None
+		if root_histogram.GetSumw2N() > 0:
+			sumw2 = numpy.array(numpy.ndarray(root_histogram.GetNcells(), dtype=numpy.double, buffer=root_histogram.GetSumw2().GetArray())).reshape(shape)
+		for axisNumber, starts in enumerate(reduce_starts):
+			contents = numpy.add.reduceat(contents, starts, axis=dimension-1-axisNumber)
+			if not sumw2 is None:
+				sumw2 = numpy.add.reduceat(sumw2, starts, axis=dimension-1-axisNumber)
+		
+		entries = root_histogram.GetEntries()
+		bins_args = []
+		for bin_edges in new_bin_edges:
+			bins_args.extend([len(bin_edges)-1, bin_edges])
+		root_histogram.SetBins(*bins_args)
+		root_histogram.SetContent(numpy.ascontiguousarray(contents.ravel()))
+		if not sumw2 is None:
+			numpy.ndarray(root_histogram.GetNcells(), dtype=numpy.double, buffer=root_histogram.GetSumw2().GetArray())[:] = sumw2.ravel()
+		root_histogram.SetEntries(entries)
+		return True
+
+	@staticmethod
+	def get_edge_indices(src_bin_edges, dst_bin_edges, tolerance=1e-9):
+		"""
+		Indices of the source bin edges that match the destination bin edges
+		within a tolerance relative to the range of the source binning.
+		Returns None if not all destination edges are (distinct) source edges.
+		"""
+		src_bin_edges = numpy.asarray(src_bin_edges, dtype=numpy.double)
+		dst_bin_edges = numpy.asarray(dst_bin_edges, dtype=numpy.double)
+		if (len(dst_bin_edges) < 2) or (len(dst_bin_edges) > len(src_bin_edges)):
+			return None
+		
+		# closest of the two neighbouring source edges
+		upper_indices = numpy.clip(numpy.searchsorted(src_bin_edges, dst_bin_edges), 0, len(src_bin_edges)-1)
+		lower_indices = numpy.clip(upper_indices-1, 0, len(src_bin_edges)-1)
+		indices = numpy.where(
+				numpy.abs(src_bin_edges[lower_indices]-dst_bin_edges) < numpy.abs(src_bin_edges[upper_indices]-dst_bin_edges),
+				lower_indices, upper_indices
+		)
+		
+		scale = max(abs(src_bin_edges[-1]-src_bin_edges[0]), 1e-300)
+		if numpy.any(numpy.abs(src_bin_edges[indices]-dst_bin_edges) > tolerance*scale) or numpy.any(numpy.diff(indices) <= 0):
+			return None
+		return indices
+
 	@staticmethod
 	def get_binning(root_histogram, axisNumber=0):
 		"""
@@ -662,12 +778,7 @@ class RootTools(object):
 	
 	@staticmethod
 	def rebinning_possible(src_bin_edges, dst_bin_edges):
-		if len(dst_bin_edges) > len(src_bin_edges):
-			return False
-		
-		str_src_bin_edges = [str(bin_edge) for bin_edge in src_bin_edges]
-		str_dst_bin_edges = [str(bin_edge) for bin_edge in dst_bin_edges]
-		return set(str_dst_bin_edges).issubset(set(str_src_bin_edges))
+		return (RootTools.get_edge_indices(src_bin_edges, dst_bin_edges) is not None)
 
 	@staticmethod
 	def add_root_histograms(*root_histograms, **kwargs):
@@ -707,34 +818,41 @@ class RootTools(object):
 				return root_object
 			else:
 				# first retrieve all values and errors (if available) and then sort them by increasing x values
-				x_values = root_object.GetX()
-				x_values = [x_values[index] for index in xrange(root_object.GetN())]
-				
-				y_values = root_object.GetY()
-				y_values = [y_values[index] for index in xrange(root_object.GetN())]
+				n_points = root_object.GetN()
+				x_values = numpy.ndarray(n_points, dtype=numpy.double, buffer=root_object.GetX())
+				y_values = numpy.ndarray(n_points, dtype=numpy.double, buffer=root_object.GetY())
 				
-				y_errors = [0.0] * root_object.GetN()
+				y_errors = numpy.zeros(n_points)
 				if isinstance(root_object, ROOT.TGraphAsymmErrors):
-					y_errors_high = root_object.GetEYhigh()
-					y_errors_low = root_object.GetEYlow()
-					y_errors = [(y_errors_high[index]+y_errors_low[index])/2.0 for index in xrange(root_object.GetN())]
+					y_errors_high = numpy.ndarray(n_points, dtype=numpy.double, buffer=root_object.GetEYhigh())
+					y_errors_low = numpy.ndarray(n_points, dtype=numpy.double, buffer=root_object.GetEYlow())
+					y_errors = (y_errors_high+y_errors_low)/2.0
 				elif isinstance(root_object, ROOT.TGraphErrors):
-					y_errors = root_object.GetEY()
-					y_errors = [y_errors[index] for index in xrange(root_object.GetN())]
+					y_errors = numpy.ndarray(n_points, dtype=numpy.double, buffer=root_object.GetEY())
 				
-				x_values, y_values, y_errors = (list(values) for values in zip(*sorted(zip(x_values, y_values, y_errors))))
+				sort_indices = numpy.lexsort((y_errors, y_values, x_values))
+				x_values, y_values, y_errors = x_values[sort_indices], y_values[sort_indices], y_errors[sort_indices]
 				
 				# determining the bin edges for the histogram
-				bin_edges = [(x_low+x_high)/2.0 for x_low, x_high in zip(x_values[:-1], x_values[1:])]
-				bin_edges.insert(0, x_values[0] - ((bin_edges[0]-x_values[0]) / 2.0))
-				bin_edges.append(x_values[-1] + ((x_values[-1]-bin_edges[-1]) / 2.0))
 				if isinstance(root_object, ROOT.TGraphAsymmErrors) or isinstance(root_object, ROOT.TGraphErrors):
 					bin_edges = RootTools.tgrapherr_get_binedges(root_object)
+				else:
+					bin_edges = (x_values[:-1]+x_values[1:])/2.0
+					bin_edges = numpy.concatenate((
+							[x_values[0] - ((bin_edges[0]-x_values[0]) / 2.0)],
+							bin_edges,
+							[x_values[-1] + ((x_values[-1]-bin_edges[-1]) / 2.0)]
+					))
 				
 				root_histogram = ROOT.TH1F("histogram_"+root_object.GetName(), root_object.GetTitle(), len(bin_edges)-1, array.array("d", bin_edges))
-				for index, (y_value, y_error) in enumerate(zip(y_values, y_errors)):
-					root_histogram.SetBinContent(index+1, y_value)
-					root_histogram.SetBinError(index+1, y_error)
+				
+				# contents and errors including under- and overflow bins
+				contents = numpy.zeros(n_points+2)
+				contents[1:-1] = y_values
+				errors = numpy.zeros(n_points+2)
+				errors[1:-1] = y_errors
+				root_histogram.SetContent(contents)
+				root_histogram.SetError(errors)
 				return root_histogram
 		else:
 			log.warning("Conversion of objects of type %s into histograms is not yet implemented!" % str(type(root_object)))
@@ -777,25 +895,128 @@ class RootTools(object):
 		root_file.cd()
 	
 	@staticmethod
-	def walk_root_directory(root_directory, path=""):
-		elements = []
-		for key in root_directory.GetListOfKeys():
+	def iterate_root_directory(root_directory, path=""):
+		"""
+		Iterative depth-first walk through all keys in a ROOT directory
+		
+		yields (key, path) for all keys including those of subdirectories
+		"""
+		stack = [(path, root_directory, iter(root_directory.GetListOfKeys()))]
+		while len(stack) > 0:
+			current_path, current_directory, keys = stack[-1]
+			key = next(keys, None)
+			if key is None:
+				stack.pop()
+				continue
+			key_path = os.path.join(current_path, key.GetName())
+			yield key, key_path
 			if key.GetClassName().startswith("TDirectory"):
-				elements.extend(RootTools.walk_root_directory(root_directory.Get(key.GetName()),
-					                                          os.path.join(path, key.GetName())))
-			else:
-				elements.append((key, os.path.join(path, key.GetName())))
-		return elements
+				sub_directory = current_directory.Get(key.GetName())
+				stack.append((key_path, sub_directory, iter(sub_directory.GetListOfKeys())))
+	
+	@staticmethod
+	def walk_root_directory(root_directory, path=""):
+		return [(key, key_path) for key, key_path in RootTools.iterate_root_directory(root_directory, path) if not key.GetClassName().startswith("TDirectory")]
+	
+	# absolute file path -> (modification time, index), ordered from the least to the most recently used
+	_root_file_indices = collections.OrderedDict()
+	_max_root_file_indices = 64
+	
+	@staticmethod
+	def root_file_index(root_file):
+		"""
+		Index of all objects (including directories) in a ROOT file
+		
+		returns dict: path -> (class name, highest cycle)
+		The index is cached for the most recently used local files as long as their modification time does not change.
+		"""
+		file_name = root_file.GetName()
+		cache_key = None
+		if os.path.isfile(file_name):
+			cache_key = os.path.abspath(file_name)
+			mtime = os.path.getmtime(file_name)
+			cached_mtime, cached_index = RootTools._root_file_indices.pop(cache_key, (None, None))
+			if cached_mtime == mtime:
+				RootTools._root_file_indices[cache_key] = (cached_mtime, cached_index)
+				return cached_index
+		
+		root_file_index = {}
+		for key, key_path in RootTools.iterate_root_directory(root_file):
+			# keys are sorted by decreasing cycle numbers
+			if not key_path in root_file_index:
+				root_file_index[key_path] = (key.GetClassName(), key.GetCycle())
+		
+		if not cache_key is None:
+			RootTools._root_file_indices[cache_key] = (mtime, root_file_index)
+			while len(RootTools._root_file_indices) > RootTools._max_root_file_indices:
+				RootTools._root_file_indices.popitem(last=False)
+		return root_file_index
 	
 	@staticmethod
 	def get_global_bins(root_histogram):
+		return RootTools.get_global_bins_array(root_histogram).tolist()
+	
+	@staticmethod
+	def get_global_bins_array(root_histogram):
+		"""
+		Global bin numbers of all bins except under- and overflow bins
+		
+		The order is the same as looping over x, y and z bins in nested loops (z innermost).
+		"""
 		assert isinstance(root_histogram, ROOT.TH1)
-		global_bins = []
-		for x_bin in xrange(1, root_histogram.GetNbinsX()+1):
-			for y_bin in xrange(1, root_histogram.GetNbinsY()+1):
-				for z_bin in xrange(1, root_histogram.GetNbinsZ()+1):
-					global_bins.append(root_histogram.GetBin(x_bin, y_bin, z_bin))
-		return global_bins
+		n_bins = [root_histogram.GetNbinsX(), root_histogram.GetNbinsY(), root_histogram.GetNbinsZ()][:root_histogram.GetDimension()]
+		global_bins = numpy.zeros([1]*len(n_bins), dtype=numpy.int64)
+		stride = 1
+		for axis_bins, n_axis_bins in zip(numpy.ix_(*[numpy.arange(1, n_axis_bins+1) for n_axis_bins in n_bins]), n_bins):
+			global_bins = global_bins + (axis_bins * stride)
+			stride *= (n_axis_bins + 2)
+		return global_bins.ravel()
+	
+	_histogram_array_types = [
+		("TArrayD", numpy.float64),
+		("TArrayF", numpy.float32),
+		("TArrayI", numpy.int32),
+		("TArrayS", numpy.int16),
+		("TArrayC", numpy.int8),
+	]
+	
+	@staticmethod
+	def has_bin_arrays(root_histogram):
+		"""
+		Check whether bin contents and errors of a histogram can be accessed directly via its buffers
+		
+		This is not the case for profiles and histograms with non-default bin error options.
+		"""
+		return (isinstance(root_histogram, ROOT.TH1) and
+		        (not isinstance(root_histogram, (ROOT.TProfile, ROOT.TProfile2D, ROOT.TProfile3D))) and
+		        (root_histogram.GetBinErrorOption() == ROOT.TH1.kNormal) and
+		        any([root_histogram.InheritsFrom(array_type) for array_type, dtype in RootTools._histogram_array_types]))
+	
+	@staticmethod
+	def get_bin_contents_array(root_histogram):
+		"""
+		Bin contents of all global bins (including under- and overflow bins) as numpy array (copy)
+		"""
+		for array_type, dtype in RootTools._histogram_array_types:
+			if root_histogram.InheritsFrom(array_type) and (not isinstance(root_histogram, (ROOT.TProfile, ROOT.TProfile2D, ROOT.TProfile3D))):
+				return numpy.array(numpy.ndarray(root_histogram.GetNcells(), dtype=dtype, buffer=root_histogram.GetArray()), dtype=numpy.double)
+		return numpy.array([root_histogram.GetBinContent(global_bin) for global_bin in xrange(root_histogram.GetNcells())], dtype=numpy.double)
+	
+	@staticmethod
+	def get_bin_errors_array(root_histogram, bin_contents=None):
+		"""
+		Bin errors of all global bins (including under- and overflow bins) as numpy array (copy)
+		
+		bin_contents: bin contents array, used for histograms without sum of squared weights
+		"""
+		if not RootTools.has_bin_arrays(root_histogram):
+			return numpy.array([root_histogram.GetBinError(global_bin) for global_bin in xrange(root_histogram.GetNcells())], dtype=numpy.double)
+		elif root_histogram.GetSumw2N() > 0:
+			return numpy.sqrt(numpy.ndarray(root_histogram.GetNcells(), dtype=numpy.double, buffer=root_histogram.GetSumw2().GetArray()))
+		else:
+			if bin_contents is None:
+				bin_contents = RootTools.get_bin_contents_array(root_histogram)
+			return numpy.sqrt(numpy.abs(bin_contents))
 
 	@staticmethod
 	def get_dimension(root_object):
@@ -897,20 +1118,18 @@ class RootTools(object):
 	
 	@staticmethod
 	def scale_tgraph(tgraph, scalefactor):
-		N = tgraph.GetN()
-		y = tgraph.GetY()
-		for i in range(N):
-			y[i] *= scalefactor
-		if isinstance(tgraph, ROOT.TGraphAsymmErrors):
-			yerrl = tgraph.GetEYlow()
-			yerrh = tgraph.GetEYhigh()
-			for i in range(N):
-				yerrl[i] *= scalefactor
-				yerrh[i] *= scalefactor
-		elif isinstance(tgraph, ROOT.TGraphErrors):
-			yerr = tgraph.GetEY()
-			for i in range(N):
-				yerr[i] *= scalefactor
+		"""
+		Scale y values and y errors of TGraph, TGraphErrors and TGraphAsymmErrors in place
+		"""
+		n_points = tgraph.GetN()
+		if n_points > 0:
+			buffers = [tgraph.GetY()]
+			if isinstance(tgraph, ROOT.TGraphAsymmErrors):
+				buffers.extend([tgraph.GetEYlow(), tgraph.GetEYhigh()])
+			elif isinstance(tgraph, ROOT.TGraphErrors):
+				buffers.append(tgraph.GetEY())
+			for buffer in buffers:
+				numpy.ndarray(n_points, dtype=numpy.double, buffer=buffer)[:] *= scalefactor
 		tgraph.GetHistogram().Delete()
 		tgraph.SetHistogram(0)
 
@@ -922,14 +1141,23 @@ class RootTools(object):
 
 	@staticmethod
 	def tgrapherr_get_binedges(tgraph):
-		bin_edges = []
-		for i in range(tgraph.GetN()):
-			lowedge  = RootTools.tgraph_get_point(tgraph, i)[0] - tgraph.GetErrorXlow(i)
-			highedge = RootTools.tgraph_get_point(tgraph, i)[0] + tgraph.GetErrorXhigh(i)
-			if i == 0:
-				bin_edges.append(lowedge)
-			bin_edges.append(highedge)
-		return bin_edges
+		n_points = tgraph.GetN()
+		if isinstance(tgraph, ROOT.TGraphAsymmErrors):
+			x_errors_low = numpy.ndarray(n_points, dtype=numpy.double, buffer=tgraph.GetEXlow())
+			x_errors_high = numpy.ndarray(n_points, dtype=numpy.double, buffer=tgraph.GetEXhigh())
+		elif isinstance(tgraph, ROOT.TGraphErrors):
+			x_errors_low = numpy.ndarray(n_points, dtype=numpy.double, buffer=tgraph.GetEX())
+			x_errors_high = x_errors_low
+		else:
+			x_errors_low = numpy.array([tgraph.GetErrorXlow(i) for i in xrange(n_points)])
+			x_errors_high = numpy.array([tgraph.GetErrorXhigh(i) for i in xrange(n_points)])
+		x_values = numpy.ndarray(n_points, dtype=numpy.double, buffer=tgraph.GetX())
+		
+		# lower edge of the first point followed by the upper edges of all points
+		bin_edges = x_values + x_errors_high
+		if n_points > 0:
+			bin_edges = numpy.concatenate(([x_values[0] - x_errors_low[0]], bin_edges))
+		return bin_edges.tolist()
 
 	@staticmethod
 	def load_compile_macro(macro):
@@ -948,3 +1176,41 @@ class RootTools(object):
 	def get_root_version():
 		return [int(version) for version in re.findall("\d+", ROOT.gROOT.GetVersion())]
 
+
+
+def _sum_histograms_from_files(arguments):
+	"""
+	Read and sum up histograms from a group of files
+	
+	arguments: ([(root_file_name, [(request_index, path_to_histogram), ...]), ...], names of the requests)
+	returns (dict: request index -> summed histogram, (path, file) of the first missing histogram or None)
+	"""
+	file_requests, names = arguments
+	root_histograms = {}
+	for root_file_name, requested_histograms in file_requests:
+		with TFileContextManager(root_file_name, "READ") as root_file:
+			root_file_index = RootTools.root_file_index(root_file)
+			for request_index, path_to_histogram in requested_histograms:
+				tmp_root_histogram = None
+				index_path = os.path.normpath(path_to_histogram).lstrip("/")
+				if index_path in root_file_index:
+					tmp_root_histogram = root_file.Get(index_path)
+				elif ";" in path_to_histogram:
+					# explicit cycles are not part of the index
+					tmp_root_histogram = root_file.Get(path_to_histogram)
+				if tmp_root_histogram == None:
+					return root_histograms, (path_to_histogram, root_file_name)
+				
+				if isinstance(tmp_root_histogram, ROOT.TH1):
+					# histograms detached from the file can be used directly as accumulator
+					tmp_root_histogram.SetDirectory(0)
+					if request_index in root_histograms:
+						root_histograms[request_index].Add(tmp_root_histogram)
+					else:
+						tmp_root_histogram.SetName(names[request_index])
+						root_histograms[request_index] = tmp_root_histogram
+				elif request_index in root_histograms:
+					root_histograms[request_index].Add(tmp_root_histogram)
+				else:
+					root_histograms[request_index] = tmp_root_histogram.Clone(names[request_index])
+	return root_histograms, None
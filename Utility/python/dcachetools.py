@@ -6,6 +6,13 @@ import Artus.Utility.logger as logger
 log = logging.getLogger(__name__)
 
 import copy
+import getpass
+import hashlib
+import os
+import shlex
+import subprocess
+import tempfile
+import time
 
 
 xrd_srm_replacements = {
@@ -64,3 +71,133 @@ def xrd2dcap(path):
 	for dst, src in dcap_xrd_replacements.iteritems():
 		result = result.replace(src, dst)
 	return result
+
+
+def remote_file_checksum(remote, checksum_command="gfal-sum {remote} ADLER32"):
+	"""
+	returns the checksum of a remote file as printed by checksum_command (last word of the output)
+	returns an empty string in case the checksum could not be determined
+	"""
+	command = checksum_command.format(remote=xrd2srm(remote))
+	log.debug(command)
+	try:
+		process = subprocess.Popen(shlex.split(command), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		stdout, stderr = process.communicate()
+	except OSError:
+		return ""
+	if process.returncode != 0 or len(stdout.split()) == 0:
+		return ""
+	return stdout.split()[-1]
+
+def default_remote_files_cache():
+	"""
+	per-user default directory for caching local copies of remote files:
+	$XDG_CACHE_HOME/artus/remote_files if XDG_CACHE_HOME is set, otherwise a user-specific directory in the temporary directory
+	"""
+	if os.environ.get("XDG_CACHE_HOME", ""):
+		return os.path.join(os.environ["XDG_CACHE_HOME"], "artus", "remote_files")
+	return os.path.join(tempfile.gettempdir(), "artus_remote_files_cache_" + getpass.getuser())
+
+def stage_remote_file(arguments):
+	"""
+	copy a remote file into a cache directory
+	arguments: (remote, cache_directory, copy_command, checksum_command)
+	the cache key is built from the remote path, the checksum of a copy is stored next to it (*.checksum).
+	Already staged files are reused without contacting the remote site, unless a checksum_command is given:
+	then cached copies are only reused if the remote checksum is available and unchanged.
+	returns (remote, local path) or (remote, None) in case of failures
+	"""
+	remote, cache_directory, copy_command, checksum_command = arguments
+	remote_path = remote.strip()
+
+	key = hashlib.sha1(remote_path).hexdigest()
+	local_directory = os.path.join(cache_directory, key[:2], key)
+	local = os.path.join(local_directory, os.path.basename(remote_path)[-200:])
+	checksum_file_name = local + ".checksum"
+
+	checksum = remote_file_checksum(remote_path, checksum_command) if checksum_command else ""
+	if os.path.exists(local):
+		cached_checksum = ""
+		if checksum and os.path.exists(checksum_file_name):
+			with open(checksum_file_name) as checksum_file:
+				cached_checksum = checksum_file.read().strip()
+		if (not checksum_command) or (checksum and (checksum == cached_checksum)):
+			log.debug("Use cached copy \"%s\" of \"%s\"." % (local, remote_path))
+			# the modification time marks the last usage for prune_remote_files_cache
+			os.utime(local, None)
+			return remote, local
+
+	if not os.path.exists(local_directory):
+		try:
+			os.makedirs(local_directory)
+		except OSError:
+			# only tolerate the directory being created in the meantime by a concurrent process
+			if not os.path.isdir(local_directory):
+				raise
+
+	# copy to a temporary name first, such that concurrent runs never see incomplete files
+	tmp_local = "%s.part%d" % (local, os.getpid())
+	command = copy_command.format(remote=xrd2srm(remote), local=tmp_local)
+	log.debug(command)
+	try:
+		exitCode = subprocess.call(shlex.split(command))
+	except OSError:
+		exitCode = 1
+	if exitCode != 0 or not os.path.exists(tmp_local):
+		return remote, None
+
+	os.rename(tmp_local, local)
+	os.utime(local, None)
+
+	# checksum of the copy for the verification in later runs
+	if checksum:
+		tmp_checksum_file_name = "%s.part%d" % (checksum_file_name, os.getpid())
+		with open(tmp_checksum_file_name, "w") as checksum_file:
+			checksum_file.write(checksum + "\n")
+		os.rename(tmp_checksum_file_name, checksum_file_name)
+	elif os.path.exists(checksum_file_name):
+		os.remove(checksum_file_name)
+	return remote, local
+
+def prune_remote_files_cache(cache_directory, max_size, keep_newer_than=None):
+	"""
+	remove the least recently used files from a cache filled by stage_remote_file
+	until its total size is below max_size (in bytes)
+	files modified after keep_newer_than (timestamp, e.g. the start of the current run) are never removed,
+	incomplete copies (*.part*) only if they are older than one day,
+	stored checksums (*.checksum) are removed together with their files
+	returns the number of removed bytes
+	"""
+	cached_files = []
+	total_size = 0
+	for directory, sub_directories, file_names in os.walk(cache_directory):
+		for file_name in file_names:
+			path = os.path.join(directory, file_name)
+			try:
+				status = os.stat(path)
+			except OSError:
+				continue # removed in the meantime
+			total_size += status.st_size
+			if file_name.endswith(".checksum"):
+				continue
+			if (not keep_newer_than is None) and (status.st_mtime >= keep_newer_than):
+				continue
+			if (".part" in file_name) and (status.st_mtime > time.time() - 24*60*60):
+				continue
+			cached_files.append((status.st_mtime, status.st_size, path))
+
+	removed_size = 0
+	for mtime, size, path in sorted(cached_files):
+		if total_size - removed_size <= max_size:
+			break
+		try:
+			os.remove(path)
+			removed_size += size
+			if os.path.exists(path + ".checksum"):
+				os.remove(path + ".checksum")
+			log.debug("Removed \"%s\" from the remote files cache." % path)
+		except OSError:
+			pass # removed in the meantime by a concurrent process
+	if removed_size > 0:
+		log.info("Removed %.1f GB from the remote files cache \"%s\"." % (removed_size / 1024.0**3, cache_directory))
+	return removed_size
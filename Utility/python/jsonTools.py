@@ -75,10 +75,11 @@ class JsonDict(dict):
 	@staticmethod
 	def mergeAll(*jsonDicts):
 		""" merge all given parameters into one JSON dict """
-		if len(jsonDicts) == 1:
-			return JsonDict(jsonDicts[0])
-		else:
-			return reduce(lambda jsonDict1, jsonDict2: JsonDict(jsonDict1) + JsonDict(jsonDict2), jsonDicts)
+		result = JsonDict(jsonDicts[0] if len(jsonDicts) > 0 else {})
+		# merge into one accumulator instead of creating a new JsonDict per step
+		for jsonDict in jsonDicts[1:]:
+			JsonDict.deepmerge(result, JsonDict(jsonDict))
+		return result
 
 	def __sub__(self, jsonDict2):
 		""" compares two JSON dicts and returns two diff dicts """
@@ -135,10 +136,18 @@ class JsonDict(dict):
 		""" expands environment variables in dictionary values """
 		return JsonDict(JsonDict.deepexpandvars(self))
 
-	def doReplaceFilesByLocalCopies(self, tmp_directory, remote_identifiers=None):
+	def doTransforms(self, includes=True, nick=None, comments=True, expandvars=False):
+		"""
+		resolves includes, nicks (if a nick is given), comments and environment variables in one walk
+		editing this object in place and returns the result
+		"""
+		result = JsonDict.deeptransform(self, includes=includes, nick=nick, comments=comments, expandvars=expandvars)
+		return result if isinstance(result, JsonDict) else JsonDict(result)
+
+	def doReplaceFilesByLocalCopies(self, tmp_directory, remote_identifiers=None, n_processes=1, verify=False):
 		""" download remote files in dictionary values first and point to this copies in the dictionary """
 		remote_identifiers = ["dcap", "root"]
-		return JsonDict(JsonDict.deepreplaceremotefiles(self, tmp_directory, remote_identifiers))
+		return JsonDict(JsonDict.deepreplaceremotefiles(self, tmp_directory, remote_identifiers, n_processes=n_processes, verify=verify))
 
 	def __str__(self):
 		""" converts JSON dict to a string """
@@ -350,45 +359,116 @@ class JsonDict(dict):
 		return result
 
 	@staticmethod
-	def deepreplaceremotefiles(jsonDict, tmp_directory, remote_identifiers=None):
-		""" download remote files in dictionary values first and point to this copies in the dictionary """
+	def deeptransform(jsonDict, includes=True, nick=None, comments=True, expandvars=False):
+		"""
+		applies deepinclude, deepresolvenicks, deepuncomment and deepexpandvars (in this order)
+		in a single recursive walk. Dicts and lists are edited in place, new objects are only
+		created for sub-trees containing includes. Set nick to None to skip the nick resolution.
+		"""
+
+		if includes and isinstance(jsonDict, dict) and ("include" in jsonDict or "property" in jsonDict):
+			jsonDict = JsonDict.deepinclude(jsonDict)
+			includes = False
+
+		if isinstance(jsonDict, dict):
+			for key, value in jsonDict.items():
+				valueIncludes = includes
+				if valueIncludes and isinstance(value, dict) and ("include" in value or "property" in value):
+					value = JsonDict.deepinclude(value)
+					valueIncludes = False
+
+				if (not nick is None) and isinstance(value, dict) and isinstance(value.get("nick"), dict):
+					nickDict = value["nick"]
+					value = nickDict.get(tools.matchingItem(nickDict.keys(), nick),
+					                     nickDict.get("default"))
+					if value is None:
+						del jsonDict[key]
+						continue
+
+				valueComments = comments and not key.strip().startswith(JsonDict.COMMENT_DELIMITER)
+				if valueComments and isinstance(value, basestring) and value.strip().startswith(JsonDict.COMMENT_DELIMITER):
+					del jsonDict[key]
+					continue
+
+				jsonDict[key] = JsonDict.deeptransform(value, includes=valueIncludes, nick=nick,
+				                                       comments=valueComments, expandvars=expandvars)
+
+		elif isinstance(jsonDict, collections.Iterable) and not isinstance(jsonDict, basestring):
+			# like deepinclude, this flattens nested lists
+			if includes:
+				jsonDict = JsonDict.deepinclude(jsonDict)
+			if comments:
+				jsonDict[:] = [element for element in jsonDict if not (isinstance(element, basestring) and element.strip().startswith(JsonDict.COMMENT_DELIMITER))]
+			if expandvars:
+				for index, element in enumerate(jsonDict):
+					jsonDict[index] = JsonDict.deeptransform(element, includes=False, nick=None,
+					                                         comments=False, expandvars=expandvars)
+
+		elif expandvars and isinstance(jsonDict, basestring):
+			jsonDict = os.path.expandvars(jsonDict)
+
+		return jsonDict
+
+	@staticmethod
+	def deepreplaceremotefiles(jsonDict, tmp_directory, remote_identifiers=None, n_processes=1, verify=False,
+	                           copy_command="gfal-copy --timeout 1800 --force {remote} file://{local}",
+	                           checksum_command="gfal-sum {remote} ADLER32"):
+		"""
+		download remote files in dictionary values first and point to this copies in the dictionary
+		tmp_directory is used as cache (see dcachetools.stage_remote_file),
+		cached copies are only verified against the remote checksums if verify is True,
+		the files are staged in n_processes parallel processes
+		"""
 		remote_identifiers = ["dcap", "root", "srm"]
-		
+
 		if not os.path.exists(tmp_directory):
 			os.makedirs(tmp_directory)
-		
+
+		remote_files = sorted(set(JsonDict._deepfindremotefiles(jsonDict, remote_identifiers)))
+		local_files = {}
+		if len(remote_files) > 0:
+			local_files = dict(tools.parallelize(
+					dcachetools.stage_remote_file,
+					[(remote_file, tmp_directory, copy_command, checksum_command if verify else "") for remote_file in remote_files],
+					n_processes=n_processes,
+					description="Staging remote files"
+			))
+		for remote_file, local_file in local_files.items():
+			if local_file is None:
+				log.critical("Could not download \""+remote_file+"\"!")
+				local_files.pop(remote_file)
+
+		return JsonDict._deepreplacestrings(jsonDict, local_files)
+
+	@staticmethod
+	def _deepfindremotefiles(jsonDict, remote_identifiers):
+		""" yields all string values starting with one of the remote identifiers """
+		if isinstance(jsonDict, dict):
+			for value in jsonDict.values():
+				for item in JsonDict._deepfindremotefiles(value, remote_identifiers):
+					yield item
+		elif isinstance(jsonDict, collections.Iterable) and not isinstance(jsonDict, basestring):
+			for element in jsonDict:
+				for item in JsonDict._deepfindremotefiles(element, remote_identifiers):
+					yield item
+		elif isinstance(jsonDict, basestring):
+			if any([jsonDict.strip().startswith(remote_identifier) for remote_identifier in remote_identifiers]):
+				yield jsonDict
+
+	@staticmethod
+	def _deepreplacestrings(jsonDict, replacements):
+		""" returns a copy of the JSON dictionary with string values replaced according to the replacements dict """
 		result = None
 		if isinstance(jsonDict, dict):
 			result = JsonDict()
 			for key, value in jsonDict.items():
-				result[key] = JsonDict.deepreplaceremotefiles(value, tmp_directory, remote_identifiers)
+				result[key] = JsonDict._deepreplacestrings(value, replacements)
 		elif isinstance(jsonDict, collections.Iterable) and not isinstance(jsonDict, basestring):
 			result = []
 			for item in jsonDict:
-				result.append(JsonDict.deepreplaceremotefiles(item, tmp_directory, remote_identifiers))
+				result.append(JsonDict._deepreplacestrings(item, replacements))
 		elif isinstance(jsonDict, basestring):
-			if any([jsonDict.strip().rstrip().startswith(remote_identifier) for remote_identifier in remote_identifiers]):
-				#prefix, suffix = os.path.splitext(jsonDict.strip().rstrip())
-				#result = tempfile.mktemp(prefix=prefix+"_", suffix=suffix, dir=tmp_directory)
-				result = os.path.join(tmp_directory, jsonDict.strip().rstrip().replace(":", "_").replace("/", "__")[-200:])
-				copy_command = "gfal-copy --timeout 1800 --force {remote} file://{local}".format(remote=dcachetools.xrd2srm(jsonDict), local=result)
-				log.debug(copy_command)
-				success = True
-				try:
-					exitCode = logger.subprocessCall(copy_command.split())
-					if exitCode != 0:
-						result = jsonDict
-						success = False
-						log.critical("Could not download \""+jsonDict+"\"!")
-						sys.exit(1)
-				except:
-					result = jsonDict
-					success = False
-				if not success:
-					log.critical("Could not download \""+jsonDict+"\"!")
-					#sys.exit(1)
-			else:
-				result = jsonDict
+			result = replacements.get(jsonDict, jsonDict)
 		else:
 			result = jsonDict
 		return result
@@ -228,6 +228,80 @@ def write_dbsfile(input_files, max_files_per_nick=None):
 
 	return dbsFileContent
 
+def _read_first_line(filename):
+	try:
+		with open(filename, "r") as input_file:
+			return input_file.readline().strip()
+	except IOError:
+		return None
+
+def read_git_revision(repo_dir):
+	"""
+	read the commit hash of HEAD directly from the .git directory/file of a repository
+	without calling git. Detached HEADs, loose and packed refs and worktrees/submodules
+	(.git files pointing to the actual git directory) are supported.
+	returns None in case the revision cannot be determined this way
+	"""
+	git_dir = os.path.join(repo_dir, ".git")
+	if os.path.isfile(git_dir):
+		git_file_content = _read_first_line(git_dir)
+		if (git_file_content is None) or (not git_file_content.startswith("gitdir:")):
+			return None
+		git_dir = os.path.normpath(os.path.join(repo_dir, git_file_content[len("gitdir:"):].strip()))
+
+	# worktrees share the refs of the main repository
+	common_dir = git_dir
+	common_dir_content = _read_first_line(os.path.join(git_dir, "commondir"))
+	if common_dir_content:
+		common_dir = os.path.normpath(os.path.join(git_dir, common_dir_content))
+
+	head = _read_first_line(os.path.join(git_dir, "HEAD"))
+	resolved_refs = []
+	while (not head is None) and head.startswith("ref:"):
+		ref = head[len("ref:"):].strip()
+		if ref in resolved_refs:
+			return None
+		resolved_refs.append(ref)
+
+		head = _read_first_line(os.path.join(git_dir, ref))
+		if (head is None) and (common_dir != git_dir):
+			head = _read_first_line(os.path.join(common_dir, ref))
+		if head is None:
+			try:
+				with open(os.path.join(common_dir, "packed-refs"), "r") as packed_refs:
+					for line in packed_refs:
+						items = line.split()
+						if (len(items) == 2) and (items[1] == ref):
+							head = items[0]
+							break
+			except IOError:
+				pass
+
+	if (head is None) or (re.match("^[0-9a-f]{40}([0-9a-f]{24})?$", head) is None):
+		return None
+	return head
+
+def get_repository_revision(arguments):
+	"""
+	determine the revision of a repository
+	arguments: (repo_dir, repo_type, check_dirty) with repo_type ".git" or ".svn"
+	for git repositories, the revision is read from the .git directory and git is only called
+	for the dirty state (if requested) or in case the revision cannot be read directly
+	returns (repo_dir, revision, dirty), where dirty is None if it has not been checked
+	"""
+	repo_dir, repo_type, check_dirty = arguments
+	revision = None
+	dirty = None
+	if repo_type == ".git":
+		revision = read_git_revision(repo_dir)
+		if revision is None:
+			revision = subprocessCall("git rev-parse HEAD".split(), cwd=repo_dir)[0].replace("\n", "")
+		if check_dirty:
+			dirty = (subprocessCall("git status --porcelain --untracked-files=no".split(), cwd=repo_dir)[0].strip() != "")
+	else:
+		revision = subprocessCall("svn info".split(), cwd=repo_dir)[0].replace("\n", "")
+	return repo_dir, revision, dirty
+
 def get_folder_size(folder):
 	total_size = os.path.getsize(folder)
 	for item in os.listdir(folder):
@@ -11,10 +11,97 @@ __all__ = [
 import os
 import gc
 import re
+import shutil
+import tempfile
+import multiprocessing
 from array import array
+import numpy
 import ROOT
 
 
+# supported types of new branches mapped to (leaf type, array typecode, numpy dtype)
+BRANCH_TYPES = {
+    "F": ("F", "f", numpy.float32),
+    "D": ("D", "d", numpy.float64),
+    "I": ("I", "i", numpy.int32),
+    "L": ("L", "l", numpy.int64),
+    "O": ("O", "b", numpy.bool_),
+}
+
+
+def _mapParallel(func, argsList, nProcesses=1):
+    """
+    Maps *func* on *argsList* in *nProcesses* worker processes, or sequentially for
+    *nProcesses* <= 1.
+    """
+    nProcesses = min(nProcesses, len(argsList))
+    if nProcesses <= 1:
+        return [func(args) for args in argsList]
+
+    pool = multiprocessing.Pool(processes=nProcesses)
+    try:
+        return pool.map(func, argsList, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _processBudget(nProcesses, maxOpenFiles, filesPerProcess=2):
+    """
+    Returns the number of processes that can run in parallel when each of them keeps
+    *filesPerProcess* files open and at most *maxOpenFiles* files may be open at once.
+    """
+    if maxOpenFiles is None:
+        return max(1, nProcesses)
+    return max(1, min(nProcesses, maxOpenFiles // filesPerProcess))
+
+
+def _copyTree(args):
+    """
+    Worker function for :py:func:`TreeIOHelper.copyTrees`.
+    """
+    treePath, copyTreePath, force = args
+    helper = TreeIOHelper()
+    try:
+        return helper.copyTree(treePath, copyTreePath, force=force)
+    finally:
+        helper.close()
+
+
+def _mergeChain(args):
+    """
+    Worker function for :py:class:`TreeMerger`. Merges the trees given by *treePaths* via a
+    *TChain*, which keeps only one input file open at a time, into *filePath* using fast cloning.
+    """
+    treePaths, filePath, treeName = args
+    chain = ROOT.TChain(treeName)
+    for treePath in treePaths:
+        chain.Add(treePath)
+    chain.Merge(filePath, "fast")
+    return TreeIOHelper.joinTreePath(filePath, treeName)
+
+
+def _declareChunkHelpers():
+    """
+    Declares the C++ helper to fill a branch with the values of a contiguous buffer.
+    """
+    if hasattr(ROOT, "artusTreeExtenderFillBranch"):
+        return
+
+    ROOT.gInterpreter.Declare("""
+    Long64_t artusTreeExtenderFillBranch(TBranch* branch, void* data, Long64_t nEntries, Long64_t entrySize)
+    {
+        char* address = static_cast<char*>(data);
+        for (Long64_t entry = 0; entry < nEntries; ++entry)
+        {
+            branch->SetAddress(address + entry * entrySize);
+            branch->Fill();
+        }
+        return nEntries;
+    }
+    """)
+
+
 class TreeExtender(object):
     """
     Helper class to add new branches to an existing tree. *treePath* defines to tree to extend. See
@@ -40,6 +127,21 @@ class TreeExtender(object):
 
     Prior to each iteration, the values of new branches are set to a default value. You may change
     this value be changing the class member *DEFAULT_VALUE* which defaults to ``-1e5``.
+
+    Instead of iterating over single entries, the tree can be extended in chunks via
+    :py:func:`extendChunked`. The callback receives numpy arrays of the unpacked branches and
+    returns numpy arrays for the new branches:
+
+    .. code-block:: python
+
+       with TreeExtender("/source/file.root/myTree", "/target/file.root") as extender:
+           extender.addBranch("myNewBranch", branchType="D", unpackBranches=["branchXYZ"])
+           extender.addBranch("myNewFlag", branchType="O")
+
+           extender.extendChunked(lambda arrays: {
+               "myNewBranch": arrays["branchXYZ"] * 2,
+               "myNewFlag": arrays["branchXYZ"] > 0,
+           })
     """
 
     DEFAULT_VALUE = -1e5
@@ -57,7 +159,7 @@ class TreeExtender(object):
         self.tree = self.treeIOHelper.getTree(treePath, mode="UPDATE")
         self.file = self.treeIOHelper._files[filePath]
 
-        # store data for new branches in tuples (name, nLeaves)
+        # store data for new branches in tuples (name, nLeaves, branchType)
         # and names of branches to unpack
         self.branchData     = []
         self.unpackBranches = set()
@@ -78,16 +180,22 @@ class TreeExtender(object):
     def __exit__(self, cls, err, traceback):
         return False
 
-    def addBranch(self, name, nLeaves=1, unpackBranches=None):
+    def addBranch(self, name, nLeaves=1, unpackBranches=None, branchType="F"):
         """
         Adds a new branch *name* with *nLeaves* when *extend* is invoked, i.e. when the internal
         iterator is requested. *unpackBranches* should be a list of names of branches that will be
-        unpacked during the iterations. ``"*"`` will unpack all branches.
+        unpacked during the iterations. ``"*"`` will unpack all branches. *branchType* is one of the
+        keys of *BRANCH_TYPES*, i.e. ``"F"`` (float), ``"D"`` (double), ``"I"`` (int), ``"L"``
+        (long) or ``"O"`` (bool).
         """
         if self.isTuple:
             nLeaves = 1
+            branchType = "F"
+
+        if branchType not in BRANCH_TYPES:
+            raise ValueError("unsupported branch type: " + str(branchType))
 
-        self.branchData.append((name, nLeaves))
+        self.branchData.append((name, nLeaves, branchType))
 
         # parse unpackBranches
         if unpackBranches is None:
@@ -125,12 +233,12 @@ class TreeExtender(object):
         # store new arrays and ranges according to their lengths for a reset before each iteration
         newBranches = []
         newArrays   = []
-        for name, nLeaves in self.branchData:
-            arr = array("f", nLeaves * [0.])
-            branch = self.tree.Branch(name, arr, name + "/F")
+        for name, nLeaves, branchType in self.branchData:
+            arr = array(BRANCH_TYPES[branchType][1], nLeaves * [0])
+            branch = self.tree.Branch(name, arr, self._leafList(name, nLeaves, branchType))
             arrays[name] = arr
             newBranches.append(branch)
-            newArrays.append((arr, range(nLeaves)))
+            newArrays.append((arr, range(nLeaves), self._defaultValue(branchType)))
             setattr(Entry, name, property(getter(name)))
 
         # also store the arrays of the already existing branches
@@ -153,9 +261,9 @@ class TreeExtender(object):
             self.tree.GetEntry(i)
 
             # reset values of new branches to a default value
-            for arr, leafRange in newArrays:
+            for arr, leafRange, defaultValue in newArrays:
                 for j in leafRange:
-                    arr[j] = self.DEFAULT_VALUE
+                    arr[j] = defaultValue
 
             # yield
             yield entry
@@ -173,6 +281,80 @@ class TreeExtender(object):
 
         gc.collect()
 
+    def extendChunked(self, callback, chunkSize=100000):
+        """
+        Extends the tree in chunks of *chunkSize* entries as an alternative to the iterator. For
+        each chunk, *callback* is invoked with a dict that maps the names of the unpacked, existing
+        branches to numpy arrays of their values (converted to double, with shape *(n, nLeaves)* for
+        fixed-size arrays). It should return a dict that maps names of new branches to numpy arrays
+        of shape *(n,)* or *(n, nLeaves)*. New branches missing in the returned dict are filled with
+        *DEFAULT_VALUE*.
+        """
+        if self.extended:
+            return
+        self.extended = True
+
+        _declareChunkHelpers()
+
+        # create the new branches, the buffers are only used for the branch creation and as
+        # valid addresses after filling
+        newBranches = []
+        for name, nLeaves, branchType in self.branchData:
+            buf = numpy.zeros(nLeaves, dtype=BRANCH_TYPES[branchType][2])
+            branch = self.tree.Branch(name, buf, self._leafList(name, nLeaves, branchType))
+            newBranches.append((name, nLeaves, branchType, branch, buf))
+
+        newNames = set(name for name, _, _ in self.branchData)
+        inputNames = [name for name in self.unpackBranches if name not in newNames]
+
+        nEntries = self.tree.GetEntries()
+        maxLeaves = max([sum(leaf.GetLen() for leaf in self.tree.GetBranch(name).GetListOfLeaves())
+                         for name in inputNames] + [1])
+        self.tree.SetEstimate(chunkSize * maxLeaves + 1)
+
+        for firstEntry in range(0, nEntries, chunkSize):
+            n = min(chunkSize, nEntries - firstEntry)
+
+            # read the existing branches in bulk
+            inputs = {}
+            for name in inputNames:
+                nRows = self.tree.Draw(name, "", "goff", n, firstEntry)
+                values = numpy.array(numpy.ndarray(nRows, dtype=numpy.double, buffer=self.tree.GetV1()))
+                inputs[name] = values if nRows == n else values.reshape(n, -1)
+
+            outputs = callback(inputs) or {}
+
+            # fill the new branches from contiguous buffers
+            for name, nLeaves, branchType, branch, buf in newBranches:
+                values = numpy.empty((n, nLeaves), dtype=BRANCH_TYPES[branchType][2])
+                if name in outputs:
+                    values[...] = numpy.asarray(outputs[name]).reshape(n, nLeaves)
+                else:
+                    values[...] = self._defaultValue(branchType)
+                ROOT.artusTreeExtenderFillBranch(branch, values, n, values.itemsize * nLeaves)
+                branch.SetAddress(buf)
+
+            if self.writeEvery > 0 and (firstEntry + n) // self.writeEvery > firstEntry // self.writeEvery:
+                self.tree.Write()
+
+        # write the tree
+        self.file.cd()
+        self.tree.Write()
+
+        gc.collect()
+
+    @classmethod
+    def _defaultValue(cls, branchType):
+        if branchType == "O":
+            return 0
+        elif branchType in ("I", "L"):
+            return int(cls.DEFAULT_VALUE)
+        return cls.DEFAULT_VALUE
+
+    @staticmethod
+    def _leafList(name, nLeaves, branchType):
+        return name + ("[%d]" % nLeaves if nLeaves > 1 else "") + "/" + BRANCH_TYPES[branchType][0]
+
 
 class TreeMerger(object):
     """
@@ -197,9 +379,17 @@ class TreeMerger(object):
         merger.addTree("/source/file1.root")
         merger.addTree("/source/file2.root")
         merger.merge()
+
+    By default, all trees are opened at once and merged in memory. When *nProcesses* is larger
+    than 1 or *maxOpenFiles* is set, the file-parallel mode is used instead: the trees are split
+    into *nProcesses* groups which are merged in worker processes into temporary files, which are
+    then combined. All merging steps use fast cloning via chains, so that each process opens only
+    one input and one output file at a time. The number of worker processes is reduced such that
+    not more than *maxOpenFiles* files are open at once. The file-parallel mode requires trees to
+    be added as paths.
     """
 
-    def __init__(self, treePath, force=False):
+    def __init__(self, treePath, force=False, nProcesses=1, maxOpenFiles=None):
         super(TreeMerger, self).__init__()
 
         self.treeIOHelper = TreeIOHelper()
@@ -214,6 +404,9 @@ class TreeMerger(object):
 
         self.treePaths = []
 
+        self.nProcesses   = nProcesses
+        self.maxOpenFiles = maxOpenFiles
+
         self.merged = False
 
     def __del__(self):
@@ -243,6 +436,10 @@ class TreeMerger(object):
         if not len(self.treePaths):
             return
 
+        if self.nProcesses > 1 or self.maxOpenFiles is not None:
+            self._mergeFileParallel()
+            return
+
         # read in all trees and store them in a tlist
         tlist = ROOT.TList()
         for i, treePath in enumerate(self.treePaths):
@@ -265,6 +462,39 @@ class TreeMerger(object):
 
         gc.collect()
 
+    def _mergeFileParallel(self):
+        # resolve tree names first, files are only opened for this if necessary
+        treePaths = []
+        for treePath in self.treePaths:
+            if isinstance(treePath, ROOT.TTree):
+                raise TreePathFormatError(treePath)
+            filePath = self.treeIOHelper.splitTreePath(treePath)[0]
+            treeName = self.treeIOHelper.getFirstTreeName(treePath)
+            treePaths.append(self.treeIOHelper.joinTreePath(filePath, treeName))
+        if self.treeName is None:
+            self.treeName = self.treeIOHelper.splitTreePath(treePaths[0])[1]
+
+        nProcesses = min(_processBudget(self.nProcesses, self.maxOpenFiles), len(treePaths))
+        if nProcesses <= 1:
+            _mergeChain((treePaths, self.filePath, self.treeName))
+            return
+
+        # merge contiguous groups of trees in parallel, which preserves the order of entries
+        tmpDir = tempfile.mkdtemp(prefix="treemerger_", dir=os.path.dirname(os.path.abspath(self.filePath)))
+        try:
+            groupSize = (len(treePaths) + nProcesses - 1) // nProcesses
+            groups = [treePaths[i:i + groupSize] for i in range(0, len(treePaths), groupSize)]
+            argsList = [(group, os.path.join(tmpDir, "merged_%d.root" % i), self.treeName)
+                        for i, group in enumerate(groups)]
+            tmpTreePaths = _mapParallel(_mergeChain, argsList, nProcesses=nProcesses)
+
+            # combine the sub-results
+            _mergeChain((tmpTreePaths, self.filePath, self.treeName))
+        finally:
+            shutil.rmtree(tmpDir)
+
+        gc.collect()
+
 
 class TreeIOHelper(object):
     """
@@ -280,9 +510,15 @@ class TreeIOHelper(object):
         self._files = {}
 
     def __del__(self):
-        # close temporary files
+        self.close()
+
+    def close(self):
+        """
+        Closes all files that were opened by this helper.
+        """
         for tfile in self._files.values():
             tfile.Close()
+        self._files.clear()
 
     @classmethod
     def splitTreePath(cls, treePath, expand=True):
@@ -395,6 +631,22 @@ class TreeIOHelper(object):
 
         return self.joinTreePath(copyFilePath, copyTreeName)
 
+    def copyTrees(self, treePaths, copyTreePaths, force=False, nProcesses=1, maxOpenFiles=None):
+        """
+        Copies multiple trees given by *treePaths* into the files identified by *copyTreePaths*
+        (see :py:func:`copyTree`) in *nProcesses* worker processes and returns the final
+        *copyTreePaths*. Each copy only keeps its source and target file open while it is running.
+        The number of worker processes is reduced such that not more than *maxOpenFiles* files are
+        open at once.
+        """
+        if len(treePaths) != len(copyTreePaths):
+            raise ValueError("number of trees and target paths differ")
+
+        nProcesses = _processBudget(nProcesses, maxOpenFiles)
+        argsList = [(treePath, copyTreePath, force)
+                    for treePath, copyTreePath in zip(treePaths, copyTreePaths)]
+        return _mapParallel(_copyTree, argsList, nProcesses=nProcesses)
+
     def getFirstTreeName(self, treePath):
         """
         Returns the name of the first tree found in a file defined by *treePath*. If *treePath*
@@ -14,11 +14,66 @@ ROOT.gROOT.SetBatch(True)
 ROOT.PyConfig.IgnoreCommandLineOptions = True
 ROOT.gErrorIgnoreLevel = ROOT.kError
 
-import Artus.Utility.progressiterator as progressiterator
+import Artus.Utility.tools as tools
 import Artus.Utility.tfilecontextmanager as tfilecontextmanager
 import Artus.HarryPlotter.utility.roottools as roottools
 
 
+ROOT.gInterpreter.Declare("""
+Long64_t artusAnnotateTreesFill(TTree* tree, Long64_t nEntries)
+{
+	for (Long64_t entry = 0; entry < nEntries; ++entry)
+	{
+		tree->Fill();
+	}
+	return nEntries;
+}
+""")
+
+types = {
+	bool : "O",
+	int : "I",
+	float : "D",
+	str : "C",
+}
+
+
+def annotate_file(arguments):
+	"""add a friend tree with constant branches to the tree in one file"""
+	file_name, tree_path, branches, value_types, values, basket_size = arguments
+	with tfilecontextmanager.TFileContextManager(file_name, "UPDATE") as root_file:
+		tree = root_file.Get(tree_path)
+		
+		dir_name = os.path.dirname(tree_path)
+		if not dir_name == "":
+			root_file.Get(dir_name)
+		
+		elements = zip(*roottools.RootTools.walk_root_directory(root_file))[-1]
+		friend_tree_name = None
+		n_trials = 0
+		while friend_tree_name is None:
+			tmp_friend_tree_name = (tree.GetName()+"_friend_"+str(n_trials)).rstrip("_0")
+			if not tmp_friend_tree_name in elements:
+				friend_tree_name = tmp_friend_tree_name
+			n_trials += 1
+		friend_tree = ROOT.TTree(friend_tree_name, tree.GetTitle()+" (friend)")
+		
+		# constant values compress very well, therefore large baskets are used to keep their number low
+		buffers = []
+		for branch, value_type, value in zip(branches, value_types, values):
+			buffers.append(numpy.zeros(1, dtype=value_type))
+			buffers[-1][0] = value
+			friend_tree.Branch(branch, buffers[-1], "%s/%s" % (branch, types[value_type]), basket_size)
+		
+		ROOT.artusAnnotateTreesFill(friend_tree, tree.GetEntries())
+		
+		friend_tree.AddFriend(tree, tree.GetName())
+		tree.AddFriend(friend_tree, friend_tree.GetName())
+		
+		root_file.Write()
+	return file_name
+
+
 def main():
 	
 	parser = argparse.ArgumentParser(description="Add friend to tree in file with constant values.",
@@ -32,6 +87,10 @@ def main():
 	                    help="Values to add to the friend tree. Each value gets a separate branch.")
 	parser.add_argument("-b", "--branches", nargs="+", default=[None],
 	                    help="Branch names.")
+	parser.add_argument("--basket-size", type=int, default=1024*1024,
+	                    help="Basket size (in bytes) of the new branches. [Default: %(default)s]")
+	parser.add_argument("-n", "--n-processes", type=int, default=1,
+	                    help="Number of (parallel) processes. [Default: %(default)s]")
 	
 	args = parser.parse_args()
 	logger.initLogger(args)
@@ -40,12 +99,6 @@ def main():
 		args.branches = (args.branches+(len(args.values)*[None]))[:len(args.values)]
 	args.branches = ["annotation%d" % i if b is None else b for i, b in enumerate(args.branches)]
 	
-	types = {
-		bool : "O",
-		int : "I",
-		float : "D",
-		str : "C",
-	}
 	value_types = []
 	for index, value in enumerate(args.values):
 		try:
@@ -71,37 +124,9 @@ def main():
 	for index, (branch, value_type, value) in enumerate(zip(args.branches, value_types, args.values)):
 		log.info("\t%s/%s = %s" % (branch, types[value_type], str(value)))
 	
-	for file_name in progressiterator.ProgressIterator(args.files, description="Processing files"):
-		with tfilecontextmanager.TFileContextManager(file_name, "UPDATE") as root_file:
-			tree = root_file.Get(args.tree)
-			
-			dir_name = os.path.dirname(args.tree)
-			if not dir_name == "":
-				root_file.Get(dir_name)
-			
-			elements = zip(*roottools.RootTools.walk_root_directory(root_file))[-1]
-			friend_tree_name = None
-			n_trials = 0
-			while friend_tree_name is None:
-				tmp_friend_tree_name = (tree.GetName()+"_friend_"+str(n_trials)).rstrip("_0")
-				if not tmp_friend_tree_name in elements:
-					friend_tree_name = tmp_friend_tree_name
-				n_trials += 1
-			friend_tree = ROOT.TTree(friend_tree_name, tree.GetTitle()+" (friend)")
-			
-			values = []
-			for branch, value_type, value in zip(args.branches, value_types, args.values):
-				values.append(numpy.zeros(1, dtype=value_type))
-				values[-1][0] = value
-				friend_tree.Branch(branch, values[-1], "%s/%s" % (branch, types[value_type]))
-			
-			for entry in xrange(tree.GetEntries()):
-				friend_tree.Fill()
-			
-			friend_tree.AddFriend(tree, tree.GetName())
-			tree.AddFriend(friend_tree, friend_tree.GetName())
-			
-			root_file.Write()
+	tools.parallelize(annotate_file,
+	                  [(file_name, args.tree, args.branches, value_types, args.values, args.basket_size) for file_name in args.files],
+	                  n_processes=args.n_processes, description="Processing files")
 
 
 if __name__ == "__main__":
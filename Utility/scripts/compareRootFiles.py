@@ -6,6 +6,8 @@ import Artus.Utility.logger as logger
 log = logging.getLogger(__name__)
 
 import argparse
+import json
+import numpy
 
 import ROOT
 ROOT.gROOT.SetBatch(True)
@@ -14,6 +16,7 @@ ROOT.gErrorIgnoreLevel = ROOT.kError
 
 import sys
 
+import Artus.Utility.tools as tools
 import Artus.HarryPlotter.utility.roottools as roottools
 
 opt_all = False
@@ -30,18 +33,72 @@ def main():
 	                    help="Two ROOT files to compare.")
 	parser.add_argument("-a", "--all-differences", default=False, action="store_true",
 	                    help="Check for all differences instead of stopping after the first difference. [Default: %(default)s]")
+	parser.add_argument("--rtol", type=float, default=0.0,
+	                    help="Relative tolerance for histogram and graph values. [Default: %(default)s]")
+	parser.add_argument("--atol", type=float, default=0.0,
+	                    help="Absolute tolerance for histogram and graph values. [Default: %(default)s]")
+	parser.add_argument("-n", "--n-processes", type=int, default=1,
+	                    help="Number of parallel processes, each comparing one top-level directory at a time. [Default: %(default)s]")
+	parser.add_argument("-j", "--json-summary", default=None,
+	                    help="Write a JSON summary of the differences to this file (\"-\" for stdout). [Default: %(default)s]")
 	
 	args = parser.parse_args()
 	logger.initLogger(args)
+	opt_all = args.all_differences
 	
+	# index both files once
 	inputFile1 = ROOT.TFile(args.files[0])
 	inputFile2 = ROOT.TFile(args.files[1])
-	opt_all = args.all_differences
+	objects1 = collectObjects(inputFile1)
+	objects2 = collectObjects(inputFile2)
+	
+	summary = {
+		"files" : args.files,
+		"only_in_first" : sorted([path for path in objects1 if not path in objects2]),
+		"only_in_second" : sorted([path for path in objects2 if not path in objects1]),
+		"differences" : {},
+		"unchecked" : [],
+	}
+	for path in summary["only_in_second"]:
+		log.info("Object %s of type %s is not available in first file" % (path, objects2[path]))
+	for path in summary["only_in_first"]:
+		log.info("Object %s of type %s is not available in second file" % (path, objects1[path]))
 	
-	files_equal = compareTree(inputFile1, inputFile2)
+	# compare common objects grouped by top-level directories,
+	# objects at the top level of the files form one common group
+	groups = {}
+	for path in sorted(objects1.keys()):
+		if (path in objects2) and (not isDirectory(objects1[path]) or not isDirectory(objects2[path])):
+			group = path.split("/")[0] if "/" in path else ""
+			groups.setdefault(group, []).append((path, objects1[path], objects2[path]))
+	
+	results = []
+	if (len(summary["only_in_first"]) + len(summary["only_in_second"]) == 0) or opt_all:
+		if args.n_processes > 1:
+			arguments = [(args.files[0], args.files[1], groups[group], args.rtol, args.atol, opt_all) for group in sorted(groups.keys())]
+			results = tools.parallelize(compareObjects, arguments, n_processes=args.n_processes, description="Comparing top-level directories")
+		else:
+			# re-use the already opened files
+			objects = [root_object for group in sorted(groups.keys()) for root_object in groups[group]]
+			results = [compareObjectsInFiles(inputFile1, inputFile2, objects, args.rtol, args.atol)]
 	inputFile1.Close()
 	inputFile2.Close()
 	
+	relative_differences_per_leaf.clear()
+	for result in results:
+		summary["differences"].update(result["differences"])
+		summary["unchecked"].extend(result["unchecked"])
+		for key, values in result["relative_differences_per_leaf"].iteritems():
+			relative_differences_per_leaf.setdefault(key, []).extend(values)
+	
+	files_equal = (len(summary["only_in_first"]) + len(summary["only_in_second"]) + len(summary["differences"]) == 0)
+	summary["identical"] = files_equal
+	if args.json_summary == "-":
+		print json.dumps(summary, indent=4, sort_keys=True)
+	elif args.json_summary:
+		with open(args.json_summary, "w") as json_file:
+			json.dump(summary, json_file, indent=4, sort_keys=True)
+	
 	if files_equal:
 		log.info("The files \"" + args.files[0] + "\" and \"" + args.files[1] + "\" are identical.")
 		exit(0)
@@ -53,205 +110,166 @@ def main():
 		exit(1)
 
 
-def compareBin(histo1, histo2, idx):
-	result = True
-	if histo1.GetBinCenter(idx) != histo2.GetBinCenter(idx):
-		log.info("center of bin %d not identical: %f vs %f" % (idx, histo1.GetBinCenter(idx), histo2.GetBinCenter(idx)))
-		if not opt_all:
-			return False
-		result = False
-	if histo1.GetBinWidth(idx) != histo2.GetBinWidth(idx):
-		log.info("widths of bin %d not identical: %f vs %f" % (idx, histo1.GetBinWidth(idx), histo2.GetBinWidth(idx)))
-		if not opt_all:
-			return False
-		result = False
-	if histo1.GetBinError(idx) != histo2.GetBinError(idx):
-		log.info("errors in bin %d not identical: %f vs %f" % (idx, histo1.GetBinError(idx), histo2.GetBinError(idx)))
-		if not opt_all:
-			return False
-		result = False
-	if histo1.GetBinContent(idx) != histo2.GetBinContent(idx):
-		log.info("content of bin %d not identical: %f vs %f" % (idx, histo1.GetBinContent(idx), histo2.GetBinContent(idx)))
-		if not opt_all:
-			return False
-		result = False
-	return result
+def isDirectory(class_name):
+	root_class = ROOT.TClass.GetClass(class_name)
+	return bool(root_class) and root_class.InheritsFrom("TDirectory")
 
 
-def compareTH1(directory1, directory2, histoID):
-	result = True
-	histo1 = directory1.Get(histoID)
-	histo2 = directory2.Get(histoID)
-	if histo1.GetNbinsX() != histo2.GetNbinsX():
-		log.info("binning not identical")
-		if not opt_all:
-			return False
-		result = False
-	for binx in range(0, histo1.GetNbinsX() + 2):
-		idx = histo1.GetBin(binx)
-		if not compareBin(histo1, histo2, idx):
-			if not opt_all:
-				return False
-			result = False
-	return result
+def collectObjects(directory):
+	"""walk the directory structure iteratively and return a dict with paths of all objects mapped to their class names"""
+	objects = {}
+	directories = [("", directory)]
+	while len(directories) > 0:
+		path, current_directory = directories.pop()
+		for key in current_directory.GetListOfKeys():
+			object_path = (path + "/" + key.GetName()) if path else key.GetName()
+			# the highest cycle comes first
+			if object_path in objects:
+				continue
+			objects[object_path] = key.GetClassName()
+			if isDirectory(key.GetClassName()):
+				directories.append((object_path, current_directory.Get(key.GetName())))
+	return objects
 
 
-def compareTH2(directory1, directory2, histoID):
-	histo1 = directory1.Get(histoID)
-	histo2 = directory2.Get(histoID)
-	if histo1.GetNbinsX() != histo2.GetNbinsX() or histo1.GetNbinsY() != histo2.GetNbinsY():
-		log.info("binning not identical")
-		return False
-	try:
-		for binx in range(0, histo1.GetNbinsX() + 2):
-			for biny in range(0, histo1.GetNbinsY() + 2):
-				idx1 = histo1.GetBin(binx, biny)
-				idx2 = histo2.GetBin(binx, biny)
-				if idx1 != idx2:
-					log.info("binning not identical")
-					return False
-				if not compareBin(histo1, histo2, idx1):
-					return False
-	except:
-		log.info("general error")
-		return False
-	return True
-
-
-def compareTH3(directory1, directory2, histoID):
-	histo1 = directory1.Get(histoID)
-	histo2 = directory2.Get(histoID)
-	if histo1.GetNbinsX() != histo2.GetNbinsX() or histo1.GetNbinsY() != histo2.GetNbinsY() or histo1.GetNbinsZ() != histo2.GetNbinsZ():
-		log.info("binning not identical")
-		return False
-	try:
-		for binx in range(0, histo1.GetNbinsX() + 2):
-			for biny in range(0, histo1.GetNbinsY() + 2):
-				for binz in range(0, histo1.GetNbinsZ() + 2):
-					idx1 = histo1.GetBin(binx, biny, binz)
-					idx2 = histo2.GetBin(binx, biny, binz)
-					if idx1 != idx2:
-						log.info("binning not identical")
-						return False
-					if not compareBin(histo1, histo2, idx1):
-						return False
-	except:
-		log.info("general error")
-		return False
-	return True
-
-
-def compareGraph(directory1, directory2, histoID):
-	result = True
-	histo1 = directory1.Get(histoID)
-	histo2 = directory2.Get(histoID)
-	if histo1.GetN() != histo2.GetN():
-		log.info("number of points not identical")
-		if not opt_all:
-			return False
-		result = False
+def histogramArrays(histo):
+	"""return the bin contents and errors of all cells (including under- and overflow) as numpy arrays"""
+	contents = roottools.RootTools.get_bin_contents_array(histo)
+	errors = roottools.RootTools.get_bin_errors_array(histo, bin_contents=contents)
+	return contents, errors
 
-	for point in range(histo1.GetN()):
-		if not comparePoint(histo1, histo2, point):
-			if not opt_all:
-				return False
-			result = False
-	return result
 
+def axisEdges(axis):
+	"""return the bin edges of an axis as numpy array"""
+	if axis.GetXbins().GetSize() > 0:
+		return numpy.array(numpy.ndarray(axis.GetXbins().GetSize(), dtype=numpy.double, buffer=axis.GetXbins().GetArray()))
+	return numpy.linspace(axis.GetXmin(), axis.GetXmax(), axis.GetNbins()+1)
 
-def comparePoint(graph1, graph2, point):
-	result = True
-	x1 = ROOT.Double(+1.0)
-	x2 = ROOT.Double(-1.0)
-	y1 = ROOT.Double(+0.5)
-	y2 = ROOT.Double(-0.5)
-	graph1.GetPoint(point, x1, y1)
-	graph2.GetPoint(point, x2, y2)
-	if x1 != x2:
-		log.info("x value of point %d in %s not identical: %f vs %f" % (point, graph1.GetName(), x1, x2))
-		if not opt_all:
-			return False
-		result = False
-	if y1 != y2:
-		log.info("y value of point %d in %s not identical: %f vs %f" % (point, graph1.GetName(), y1, y2))
-		if not opt_all:
-			return False
-		result = False
-	x1 = graph1.GetErrorX(point)
-	y1 = graph1.GetErrorY(point)
-	x2 = graph2.GetErrorX(point)
-	y2 = graph2.GetErrorY(point)
-	if x1 != x2:
-		log.info("x error of point %d in %s not identical: %f vs %f" % (point, graph1.GetName(), x1, x2))
-		if not opt_all:
-			return False
-		result = False
-	if y1 != y2:
-		log.info("y error of point %d in %s not identical: %f vs %f" % (point, graph1.GetName(), y1, y2))
-		if not opt_all:
-			return False
-		result = False
+
+def compareValues(description, values1, values2, rtol=0.0, atol=0.0):
+	"""compare two arrays and return a list of messages describing the differences"""
+	if values1.shape != values2.shape:
+		return ["%s: different number of values (%d vs %d)" % (description, values1.size, values2.size)]
+	differences = (numpy.abs(values1 - values2) > atol + rtol * numpy.abs(values2)) | (numpy.isnan(values1) != numpy.isnan(values2))
+	if not numpy.any(differences):
+		return []
+	indices = numpy.flatnonzero(differences)
+	deviations = numpy.abs(values1[indices] - values2[indices])
+	return ["%s differ in %d of %d values (first indices: %s, max. abs. deviation: %g)" % (
+			description, len(indices), values1.size, ", ".join([str(index) for index in indices[:5]]),
+			numpy.nanmax(deviations) if numpy.any(numpy.isfinite(deviations)) else float("nan")
+	)]
+
+
+def compareHistograms(histo1, histo2, rtol=0.0, atol=0.0):
+	"""compare two histograms (TH1, TH2, TH3) and return a list of messages describing the differences"""
+	if histo1.GetDimension() != histo2.GetDimension():
+		return ["different dimensions (%d vs %d)" % (histo1.GetDimension(), histo2.GetDimension())]
+	
+	messages = []
+	for axis_name, axis1, axis2 in zip(["x", "y", "z"], [histo1.GetXaxis(), histo1.GetYaxis(), histo1.GetZaxis()],
+	                                   [histo2.GetXaxis(), histo2.GetYaxis(), histo2.GetZaxis()])[:histo1.GetDimension()]:
+		messages.extend(compareValues("%s bin edges" % axis_name, axisEdges(axis1), axisEdges(axis2)))
+	if len(messages) > 0:
+		return messages
+	
+	contents1, errors1 = histogramArrays(histo1)
+	contents2, errors2 = histogramArrays(histo2)
+	messages.extend(compareValues("bin contents", contents1, contents2, rtol, atol))
+	if len(messages) == 0 or opt_all:
+		messages.extend(compareValues("bin errors", errors1, errors2, rtol, atol))
+	return messages
+
+
+def graphArrays(graph):
+	"""return the point values and errors of a graph as dict of numpy arrays"""
+	n_points = graph.GetN()
+	getters = ["GetX", "GetY"]
+	if isinstance(graph, ROOT.TGraphAsymmErrors):
+		getters += ["GetEXlow", "GetEXhigh", "GetEYlow", "GetEYhigh"]
+	elif isinstance(graph, ROOT.TGraphErrors):
+		getters += ["GetEX", "GetEY"]
+	arrays = {}
+	for getter in getters:
+		buffer = getattr(graph, getter)()
+		arrays[getter[3:]] = numpy.array(numpy.ndarray(n_points, dtype=numpy.double, buffer=buffer)) if (buffer and n_points > 0) else numpy.zeros(n_points)
+	return arrays
+
+
+def compareGraphs(graph1, graph2, rtol=0.0, atol=0.0):
+	"""compare two graphs and return a list of messages describing the differences"""
+	if graph1.GetN() != graph2.GetN():
+		return ["number of points not identical (%d vs %d)" % (graph1.GetN(), graph2.GetN())]
+	
+	arrays1 = graphArrays(graph1)
+	arrays2 = graphArrays(graph2)
+	if sorted(arrays1.keys()) != sorted(arrays2.keys()):
+		return ["different graph types (%s vs %s)" % (graph1.IsA().GetName(), graph2.IsA().GetName())]
+	
+	messages = []
+	for name in ["X", "Y", "EX", "EY", "EXlow", "EXhigh", "EYlow", "EYhigh"]:
+		if name in arrays1:
+			messages.extend(compareValues(name + " values", arrays1[name], arrays2[name], rtol, atol))
+			if len(messages) > 0 and not opt_all:
+				break
+	return messages
+
+
+def compareObjects(arguments):
+	"""
+	compare a list of (path, class name 1, class name 2) objects in two files given by their names
+	(worker function for parallel processing, see compareObjectsInFiles)
+	"""
+	global opt_all
+	file_name1, file_name2, objects, rtol, atol, opt_all = arguments
+	
+	inputFile1 = ROOT.TFile(file_name1)
+	inputFile2 = ROOT.TFile(file_name2)
+	result = compareObjectsInFiles(inputFile1, inputFile2, objects, rtol, atol)
+	inputFile1.Close()
+	inputFile2.Close()
 	return result
 
 
-def compareTree(directory1, directory2):
-	result = True
-	for i in directory2.GetListOfKeys():
-		obj = directory1.Get(i.GetName())
-		obj2 = directory2.Get(i.GetName())
-		if not obj:
-			log.info("Object %s of type %s in %s is not available in first file" % (i.GetName(), obj2.IsA().GetName(), directory2.GetPath().split(":")[1]))
-			if not opt_all:
-				return False
-			result = False
-	for i in directory1.GetListOfKeys():
-		obj = directory1.Get(i.GetName())
-		obj2 = directory2.Get(i.GetName())
-		if not obj2:
-			log.info("Object %s of type %s in %s is not available in second file" % (i.GetName(), obj.IsA().GetName(), directory1.GetPath().split(":")[1]))
+def compareObjectsInFiles(inputFile1, inputFile2, objects, rtol=0.0, atol=0.0):
+	"""
+	compare a list of (path, class name 1, class name 2) objects in two opened files
+	returns a dict with the differences per path, the paths of unchecked objects and relative differences of tree leaves
+	"""
+	result = {
+		"differences" : {},
+		"unchecked" : [],
+		"relative_differences_per_leaf" : {},
+	}
+	
+	for path, class_name1, class_name2 in objects:
+		messages = []
+		root_class = ROOT.TClass.GetClass(class_name1)
+		if class_name1 != class_name2:
+			messages = ["different types (%s vs %s)" % (class_name1, class_name2)]
+		elif root_class and root_class.InheritsFrom("TH1"):
+			messages = compareHistograms(inputFile1.Get(path), inputFile2.Get(path), rtol, atol)
+		elif root_class and root_class.InheritsFrom("TGraph"):
+			messages = compareGraphs(inputFile1.Get(path), inputFile2.Get(path), rtol, atol)
+		elif root_class and root_class.InheritsFrom("TTree"):
+			if not compareNtuple(inputFile1, inputFile2, path, result["relative_differences_per_leaf"]):
+				messages = ["tree not identical"]
+		else:
+			log.warning("%s of type %s has not been checked" % (path, class_name1))
+			result["unchecked"].append(path)
+		
+		if len(messages) > 0:
+			for message in messages:
+				log.info("problem with %s: %s" % (path, message))
+			result["differences"][path] = messages
 			if not opt_all:
-				return False
-			result = False
-			continue
-		identified = False
-		if obj.IsA().GetName() == "TDirectoryFile":
-			identified = True
-			if not compareTree(directory1.Get(i.GetName()), directory2.Get(i.GetName())):
-				if not opt_all:
-					return False
-				result = False
-		elif isinstance(obj, ROOT.TH2):
-			identified = True
-			if not compareTH2(directory1, directory2, i.GetName()):
-				log.info("problem with %s in %s" % (i.GetName(), directory1.GetPath().split(":")[1]))
-				if not opt_all:
-					return False
-				result = False
-		elif isinstance(obj, ROOT.TH1):
-			identified = True
-			if not compareTH1(directory1, directory2, i.GetName()):
-				log.info("problem with %s in %s" % (i.GetName(), directory1.GetPath().split(":")[1]))
-				if not opt_all:
-					return False
-				result = False
-		elif isinstance(obj, ROOT.TGraphErrors):
-			identified = True
-			if not compareGraph(directory1, directory2, i.GetName()):
-				if not opt_all:
-					return False
-				result = False
-		elif isinstance(obj, ROOT.TTree):
-			identified = True
-			if not compareNtuple(directory1, directory2, i.GetName()):
-				if not opt_all:
-					return False
-				result = False
-		if not identified:
-			log.warning("%s of type %s in %s has not been checked" % (i.GetName(), obj.IsA().GetName(), directory1.GetPath().split(":")[1]))
+				break
 	return result
 
 
-def compareNtuple(directory1, directory2, ntupleID):
+def compareNtuple(directory1, directory2, ntupleID, relative_differences=None):
+	if relative_differences is None:
+		relative_differences = relative_differences_per_leaf
 	result = True
 	ntuple1 = directory1.Get(ntupleID)
 	ntuple2 = directory2.Get(ntupleID)
@@ -295,9 +313,9 @@ def compareNtuple(directory1, directory2, ntupleID):
 				log.critical("different leaf value: " + str(leaves1.UncheckedAt(i).GetValue()) + ", " + str(leaves2.UncheckedAt(i).GetValue()) + " for name " + roottools.RootTools.full_leaf_name(leaves1.UncheckedAt(i)))
 				if leaves1.UncheckedAt(i).GetValue() != 0:
 					# save relative difference between the two leaves
-					if roottools.RootTools.full_leaf_name(leaves1.UncheckedAt(i)) not in relative_differences_per_leaf:
-						relative_differences_per_leaf[roottools.RootTools.full_leaf_name(leaves1.UncheckedAt(i))] = []
-					relative_differences_per_leaf[roottools.RootTools.full_leaf_name(leaves1.UncheckedAt(i))].append(abs(leaves1.UncheckedAt(i).GetValue() - leaves2.UncheckedAt(i).GetValue()) / leaves1.UncheckedAt(i).GetValue())
+					if roottools.RootTools.full_leaf_name(leaves1.UncheckedAt(i)) not in relative_differences:
+						relative_differences[roottools.RootTools.full_leaf_name(leaves1.UncheckedAt(i))] = []
+					relative_differences[roottools.RootTools.full_leaf_name(leaves1.UncheckedAt(i))].append(abs(leaves1.UncheckedAt(i).GetValue() - leaves2.UncheckedAt(i).GetValue()) / leaves1.UncheckedAt(i).GetValue())
 				if not opt_all:
 					return False
 				result = False
@@ -5,6 +5,7 @@ import sys
 import time
 import os
 import argparse
+import numpy
 
 import ROOT
 ROOT.gROOT.SetBatch(True)
@@ -36,6 +37,12 @@ def main():
 		help="List of quantities to be ignored in the verbose comparison")
 	parser.add_argument('-d', '--dictionary', type=str, nargs='+', default=None,
 		help="Translation of branchnames between the trees in the form branchname1:branchname2")
+	parser.add_argument('--tolerance', type=float, default=1e-3,
+		help="absolute tolerance for the verbose comparison (default: %(default)s)")
+	parser.add_argument('--relative-tolerance', type=float, default=0.0,
+		help="relative tolerance for the verbose comparison (default: %(default)s)")
+	parser.add_argument('--n-printed-keys', type=int, default=5,
+		help="number of printed (run, lumi, event) keys per differing branch (default: %(default)s)")
 
 	args = parser.parse_args()
 	if len(args.input_files) < 2:
@@ -57,8 +64,7 @@ def main():
 	print "\nGet list of runs, lumis, events:"
 	lists = []
 	for tree in trees:
-		lst = getRunLumiEvent(tree)
-		lists.append(sorted(lst))
+		lists.append(getRunLumiEvent(tree))
 	stopWatch()
 
 	print "\nCompare lists:"
@@ -109,13 +115,14 @@ def main():
 			for d in args.dictionary:
 				k, v = d.split(':', 1)
 				translation[k] = v
+		tolerances = dict(tolerance=args.tolerance, relativeTolerance=args.relative_tolerance, nPrintedKeys=args.n_printed_keys)
 		print "\nCompare common trees 1 and 2:"
-		compareTrees(c1, c2, args.ignore, translation)
+		compareTrees(c1, c2, args.ignore, translation, **tolerances)
 		if len(args.input_files) == 3:
 			print "\nCompare common trees 1 and 3:"
-			compareTrees(c1, c3, args.ignore)
+			compareTrees(c1, c3, args.ignore, **tolerances)
 			print "\nCompare common trees 2 and 3:"
-			compareTrees(c2, c3, args.ignore)
+			compareTrees(c2, c3, args.ignore, **tolerances)
 
 	stopWatch(overall=True)
 	
@@ -127,81 +134,124 @@ def stopWatch(n=[], overall=False):
 	if overall:
 		print "  -- Overall time:   %1.3f s" % (n[-1] - n[0])
 
-def getRunLumiEvent(tree):
-	"""get list of (run, lumi, event, entry index) from a tree"""
-	result = []
+def getRunLumiEvent(tree, chunk_size=10000000):
+	"""get array of (run, lumi, event, entry index) rows from a tree
+
+	The three index branches are read in bulk via TTree::Draw in chunks of chunk_size entries.
+	"""
 	nevt = tree.GetEntries()
 	eventbranch = 'event'
 	for name in ['event', 'evt', 'eventnr']:
 		if not hasattr(tree, eventbranch) and hasattr(tree, name):
 			eventbranch = name
 
-	for i in xrange(nevt):
-		tree.GetEntry(i)
-		result.append((int(tree.run), int(tree.lumi), int(getattr(tree, eventbranch)), i))
-		if i % 1000 == 0:
-			print "\r  %7d/%d" % (i, nevt),
-			sys.stdout.flush() 
-	print "\r  %7d/%d" % (i+1, nevt)
+	result = numpy.zeros((nevt, 4), dtype=numpy.int64)
+	result[:, 3] = numpy.arange(nevt, dtype=numpy.int64)
+	tree.SetEstimate(min(nevt, chunk_size) + 1)
+	for first_entry in xrange(0, nevt, chunk_size):
+		n_rows = tree.Draw("run:lumi:" + eventbranch, "", "goff", chunk_size, first_entry)
+		if n_rows < 0:
+			sys.exit("Could not read the branches run, lumi and %s of tree \"%s\"!" % (eventbranch, tree.GetName()))
+		for column, buffer in enumerate([tree.GetV1(), tree.GetV2(), tree.GetV3()]):
+			result[first_entry:first_entry+n_rows, column] = numpy.ndarray(n_rows, dtype=numpy.double, buffer=buffer)
+		print "\r  %7d/%d" % (first_entry+n_rows, nevt),
+		sys.stdout.flush()
+	print "\r  %7d/%d" % (nevt, nevt)
 	return result
 
+def getMatchingCodes(list1, list2):
+	"""Assign integer codes to the rows of two lists of (run, lumi, evt, index, ...)
+
+	Rows with equal (run, lumi, evt) get the same code, unless they are duplicates within
+	one list: the n-th duplicate (ordered by index) in list1 only gets the same code as the
+	n-th duplicate in list2.
+	"""
+	keys = numpy.concatenate([list1[:, :3], list2[:, :3]])
+	indices = numpy.concatenate([list1[:, 3], list2[:, 3]])
+	in_list2 = numpy.concatenate([numpy.zeros(len(list1), dtype=numpy.int64), numpy.ones(len(list2), dtype=numpy.int64)])
+	if len(keys) == 0:
+		return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+
+	# sort by (run, lumi, evt), then per list by index
+	order = numpy.lexsort((indices, in_list2, keys[:, 2], keys[:, 1], keys[:, 0]))
+	sorted_keys = keys[order]
+	sorted_in_list2 = in_list2[order]
+
+	new_key = numpy.ones(len(keys), dtype=bool)
+	new_key[1:] = numpy.any(sorted_keys[1:] != sorted_keys[:-1], axis=1)
+	new_group = new_key.copy()
+	new_group[1:] |= (sorted_in_list2[1:] != sorted_in_list2[:-1])
+
+	# rank of duplicates within one list
+	positions = numpy.arange(len(keys))
+	ranks = positions - numpy.maximum.accumulate(numpy.where(new_group, positions, 0))
+	key_ids = numpy.cumsum(new_key) - 1
+
+	codes = numpy.empty(len(keys), dtype=numpy.int64)
+	codes[order] = key_ids * (ranks.max() + 1) + ranks
+	return codes[:len(list1)], codes[len(list1):]
+
 def compareLists(list1, list2):
 	"""Compare two lists of (run, lumi, evt, index) and sort them into
 	   three lists: common events, events only in list 1 and events only
-	   in list 2"""
-	n = 0
-	m = 0
-	common = []
-	only1 = []
-	only2 = []
-	while n < len(list1) and m < len(list2):
-		if n % 1000 == 0 or m % 1000 == 0 and m != 0 and n!=0:
-			print "\r  tree1:%7d/%d, tree2:%7d/%d -> common:%7d, tree1: %5d, tree2: %5d" % (
-				n, len(list1), m, len(list2), len(common), len(only1), len(only2)),
-		if list1[n][:3] == list2[m][:3]:
-			common.append(list1[n] + (list2[m][3],))  # the common list has two indices
-			n += 1
-			m += 1
-		elif list1[n][:3] < list2[m][:3]:
-			only1.append(list1[n])
-			n += 1
-		elif list1[n][:3] > list2[m][:3]:
-			only2.append(list2[m])
-			m += 1
-		else:
-			print "What?"
-	print "\r  tree1:%7d/%d, tree2:%7d/%d -> common:%7d, tree1: %5d, tree2: %5d" % (
-				n, len(list1), m, len(list2), len(common), len(only1), len(only2))
+	   in list 2
+
+	   The lists are numpy arrays with one row per event. The common list contains the rows
+	   of list 1 with the index in list 2 appended and is ordered by the index of list 1,
+	   the other lists are ordered by their own indices."""
+	codes1, codes2 = getMatchingCodes(list1, list2)
+
+	sorter2 = numpy.argsort(codes2)
+	positions = numpy.minimum(numpy.searchsorted(codes2, codes1, sorter=sorter2), max(len(codes2)-1, 0))
+	partners = sorter2[positions] if len(codes2) > 0 else positions
+	matched1 = (codes2[partners] == codes1) if len(codes2) > 0 else numpy.zeros(len(codes1), dtype=bool)
+	matched2 = numpy.zeros(len(codes2), dtype=bool)
+	matched2[partners[matched1]] = True
+
+	common = numpy.concatenate([list1[matched1], list2[partners[matched1], 3:4]], axis=1)
+	only1 = list1[~matched1]
+	only2 = list2[~matched2]
+
+	common = common[numpy.argsort(common[:, 3], kind="mergesort")]
+	only1 = only1[numpy.argsort(only1[:, 3], kind="mergesort")]
+	only2 = only2[numpy.argsort(only2[:, 3], kind="mergesort")]
+	print "  tree1:%7d, tree2:%7d -> common:%7d, tree1: %5d, tree2: %5d" % (
+				len(list1), len(list2), len(common), len(only1), len(only2))
 	return common, only1, only2
 
 
 def cpTree(eventList, tree, name, treeIndex=0, deactivate=None, jsonConfigsDir=None):
-	"""Copy the events in eventList[i][3+treeIndex] from tree to a new tree of name 'name'"""
+	"""Copy the events in eventList[i][3+treeIndex] from tree to a new tree of name 'name'
+
+	If the entries are in increasing order, they are copied via a TEntryList in one
+	CopyTree call, otherwise entry by entry.
+	"""
 	if deactivate:
 		for q in quantities:
 			tree.SetBranchStatus(q, 0)
-	outputTree = tree.CloneTree(0)
-	outputTree.SetName(name)
-	outputTree.SetTitle(tree.GetTitle() + "_" + name)
-	branches = [b.GetName() for b in tree.GetListOfBranches()]
-	print "  tree %r (%d branches, %d entries) to %r (%d branches, %d entries)" % (
-		tree.GetName(), len(tree.GetListOfBranches()), tree.GetEntries(),
-		name, len(outputTree.GetListOfBranches()), outputTree.GetEntries()),
-	assert outputTree.GetEntries() == 0
+	print "  tree %r (%d branches, %d entries) to %r" % (
+		tree.GetName(), len(tree.GetListOfBranches()), tree.GetEntries(), name),
 	sys.stdout.flush()
-	
-	
-	nevt = len(eventList)
-	for i, evt in zip(range(nevt), eventList):
-		# evt is (run, lumi, event, index in tree1, index in tree2)
-		tree.GetEntry(evt[3 + treeIndex])
-		if 'TNtuple' in str(type(tree)):
-			outputTree.Fill(evt[3 + treeIndex])
-		else:
-			outputTree.Fill()
-		if i % 100 == 0:
-			print "\r  %7d/%d" % (i, nevt),
-			sys.stdout.flush()
+
+	entries = eventList[:, 3 + treeIndex]
+	if numpy.all(entries[1:] > entries[:-1]):
+		entryList = ROOT.TEntryList(name + "_entries", name + "_entries", tree)
+		for entry in entries.tolist():
+			entryList.Enter(entry)
+		tree.SetEntryList(entryList)
+		outputTree = tree.CopyTree("")
+		tree.SetEntryList(0)
+		outputTree.SetName(name)
+	else:
+		outputTree = tree.CloneTree(0)
+		outputTree.SetName(name)
+		for entry in entries.tolist():
+			tree.GetEntry(entry)
+			if 'TNtuple' in str(type(tree)):
+				outputTree.Fill(entry)
+			else:
+				outputTree.Fill()
+	outputTree.SetTitle(tree.GetTitle() + "_" + name)
 
 	outputTree.Write(name)
 	print "\r  tree %r (%d branches, %d entries) to %r (%d branches, %d entries)" % (
@@ -211,15 +261,41 @@ def cpTree(eventList, tree, name, treeIndex=0, deactivate=None, jsonConfigsDir=N
 	if not jsonConfigsDir is None:
 		jsonConfigFileName = os.path.join(jsonConfigsDir, name+".json")
 		with open(jsonConfigFileName, "w") as jsonConfigFile:
-			jsonConfigFile.write("{\n\t\"EventWhitelist\" : [\n\t\t" + (",\n\t\t".join([str(entry[2]) for entry in eventList])) + "\n\t]\n}")
+			jsonConfigFile.write("{\n\t\"EventWhitelist\" : [\n\t\t" + (",\n\t\t".join([str(event) for event in eventList[:, 2].tolist()])) + "\n\t]\n}")
 		print "  EventWhitelist saved in JSON config file \"%s\"." % jsonConfigFileName
 	
 	return outputTree
 
 
-def compareTrees(tree1, tree2, ignored=None, nameconversion=None):
+numericTypes = ["Bool_t", "Char_t", "UChar_t", "Short_t", "UShort_t", "Int_t", "UInt_t", "Long_t", "ULong_t",
+                "Long64_t", "ULong64_t", "Float_t", "Double_t", "bool", "char", "short", "int", "long", "float", "double"]
+
+def isNumericScalarBranch(tree, name):
+	"""check whether a branch consists of one numeric leaf with one value per entry"""
+	leaves = tree.GetBranch(name).GetListOfLeaves()
+	if leaves.GetEntries() != 1:
+		return False
+	leaf = leaves.At(0)
+	return (leaf.GetTypeName() in numericTypes) and (leaf.GetLen() == 1) and (not leaf.GetLeafCount())
+
+def getColumn(tree, expression, firstEntry, nEntries):
+	"""read the values of an expression for a range of entries via TTree::Draw, returns None if the expression cannot be evaluated"""
+	nRows = tree.Draw(expression, "", "goff", nEntries, firstEntry)
+	if nRows < 0:
+		return None
+	return numpy.array(numpy.ndarray(nRows, dtype=numpy.double, buffer=tree.GetV1()))
+
+def compareTrees(tree1, tree2, ignored=None, nameconversion=None, tolerance=1e-3, relativeTolerance=0.0, nPrintedKeys=5, chunk_size=1000000):
+	"""Compare the common numeric branches of two trees with aligned entries column-wise
+
+	Values differ if |v1 - v2| > tolerance + relativeTolerance * |v2|. For each branch, the number of
+	differing entries, the maximum absolute and relative deviations and the first differing
+	(run, lumi, event) keys are printed.
+	"""
 	if not nameconversion:
 		nameconversion = {}		# ex2  :  ex1
+	if not ignored:
+		ignored = []
 	branches1orig = [b.GetName() for b in tree1.GetListOfBranches()] # branches of tree1
 	branches2orig = [b.GetName() for b in tree2.GetListOfBranches()] # branches of tree2
 	branches1used = [] # branches of tree1 that are in sync with tree2
@@ -241,21 +317,61 @@ def compareTrees(tree1, tree2, ignored=None, nameconversion=None):
 	print "  %4d common branches" % len(branches1used)
 	assert len(branches1used) == len(branches2used)
 
-	tree1.AddFriend(tree2.GetName())
-	for i in xrange(tree1.GetEntries()):
-		if i % 100 == 0:
-			print "\rEntry", i,
-		tree1.GetEntry(i)
-		tree2.GetEntry(i)
-		for b1, b2 in zip(branches1used, branches2used):
-			v1 = getattr(tree1, b1)
-			v2 = getattr(tree2, b2)
-			if b1 == 'eventnr':
-				v1 = int(tree1.eventnr1) * 1000000 + tree1.eventnr2
-			if abs(v1 - v2) > 1e-3 and b1 not in ignored:
-				# print only eta differences if jets differ completely:
-				print "\rIn entry %7d, %s differs: %s = %s, %s = %s" % (i, b2, b1, v1, b2, v2)
-	print "\rEntry", i
+	comparedBranches = []
+	for b1, b2 in zip(branches1used, branches2used):
+		if b1 in ignored:
+			continue
+		if isNumericScalarBranch(tree1, b1) and isNumericScalarBranch(tree2, b2):
+			comparedBranches.append((b1, b2))
+		else:
+			print "  skip non-numeric or non-scalar branch %s" % b1
+
+	nEntries = min(tree1.GetEntries(), tree2.GetEntries())
+	keys = getRunLumiEvent(tree1)[:nEntries, :3]
+	tree1.SetEstimate(min(nEntries, chunk_size) + 1)
+	tree2.SetEstimate(min(nEntries, chunk_size) + 1)
+
+	print "  * Value comparison of %d branches in %d entries:" % (len(comparedBranches), nEntries)
+	nDifferingBranches = 0
+	nNotComparableBranches = 0
+	for b1, b2 in comparedBranches:
+		expression1 = "eventnr1*1000000+eventnr2" if b1 == 'eventnr' else b1
+		nDifferences = 0
+		maxAbsDeviation = 0.0
+		maxRelDeviation = 0.0
+		differingEntries = []
+		comparable = True
+		for firstEntry in xrange(0, nEntries, chunk_size):
+			# both trees may be longer than the compared entries
+			nChunkEntries = min(chunk_size, nEntries - firstEntry)
+			values1 = getColumn(tree1, expression1, firstEntry, nChunkEntries)
+			values2 = getColumn(tree2, b2, firstEntry, nChunkEntries)
+			if (values1 is None) or (values2 is None):
+				comparable = False
+				break
+			deviations = numpy.abs(values1 - values2)
+			differences = (deviations > (tolerance + relativeTolerance * numpy.abs(values2))) | (numpy.isnan(values1) != numpy.isnan(values2))
+			if not numpy.any(differences):
+				continue
+			nDifferences += numpy.count_nonzero(differences)
+			finiteDeviations = deviations[differences & numpy.isfinite(deviations)]
+			if len(finiteDeviations) > 0:
+				maxAbsDeviation = max(maxAbsDeviation, finiteDeviations.max())
+				relDeviations = finiteDeviations / numpy.maximum(numpy.abs(values2[differences & numpy.isfinite(deviations)]), 1e-300)
+				maxRelDeviation = max(maxRelDeviation, relDeviations.max())
+			if len(differingEntries) < nPrintedKeys:
+				differingEntries.extend((numpy.flatnonzero(differences)[:nPrintedKeys-len(differingEntries)] + firstEntry).tolist())
+		if not comparable:
+			nNotComparableBranches += 1
+			print "  %-30s not comparable: values could not be read" % (b1 if b1 == b2 else "%s/%s" % (b1, b2))
+		elif nDifferences > 0:
+			nDifferingBranches += 1
+			print "  %-30s differs in %7d entries: max. abs. deviation %g, max. rel. deviation %g" % (b1 if b1 == b2 else "%s/%s" % (b1, b2), nDifferences, maxAbsDeviation, maxRelDeviation)
+			print "  %30s first (run, lumi, event): %s" % ("", ", ".join(["(%d, %d, %d)" % tuple(keys[entry].tolist()) for entry in differingEntries]))
+	print "  %4d of %d compared branches differ" % (nDifferingBranches, len(comparedBranches))
+	if nNotComparableBranches > 0:
+		print "  %4d of %d compared branches could not be read" % (nNotComparableBranches, len(comparedBranches))
+	return nDifferingBranches
 
 
 main()
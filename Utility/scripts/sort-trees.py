@@ -9,6 +9,8 @@ import argparse
 import math
 import numpy
 import os
+import shutil
+import tempfile
 
 import ROOT
 ROOT.gROOT.SetBatch(True)
@@ -19,6 +21,108 @@ import Artus.Utility.progressiterator as progressiterator
 import Artus.Utility.tfilecontextmanager as tfilecontextmanager
 
 
+ROOT.gInterpreter.Declare("""
+Long64_t artusSortTreesCopyEntries(TTree* inputTree, TTree* outputTree, const Long64_t* entries, Long64_t nEntries)
+{
+	for (Long64_t index = 0; index < nEntries; ++index)
+	{
+		inputTree->GetEntry(entries[index]);
+		outputTree->Fill();
+	}
+	return nEntries;
+}
+""")
+
+
+def read_keys(input_tree, branches, first_entry, n_entries, n_entries_per_draw):
+	"""returns the values of the sort keys for a range of entries as list of arrays (one per branch)"""
+	values = [numpy.empty(n_entries, dtype=numpy.double) for branch in branches]
+	for offset in xrange(0, n_entries, n_entries_per_draw):
+		n_rows = input_tree.Draw(":".join(branches), "", "goff", min(n_entries_per_draw, n_entries-offset), first_entry+offset)
+		buffers = [input_tree.GetV1(), input_tree.GetV2(), input_tree.GetV3(), input_tree.GetV4()][:len(branches)]
+		for index, input_buffer in enumerate(buffers):
+			values[index][offset:offset+n_rows] = numpy.ndarray(n_rows, dtype=numpy.double, buffer=input_buffer)
+	return values
+
+
+def write_sorted_run(values, first_entry, file_name):
+	"""
+	sort one run of entries and write the sorted keys and the entry indices into a file
+	returns (file name, number of entries)
+	"""
+	n_entries = len(values[0])
+	# lexsort is stable and uses the last key as primary key
+	order = numpy.lexsort(values[::-1])
+	run = numpy.memmap(file_name, dtype=numpy.double, mode="w+", shape=(len(values)+1, max(n_entries, 1)))
+	for index, key_values in enumerate(values):
+		run[index, :n_entries] = key_values[order]
+	# the entry indices are the last (least significant) key, which keeps the sorting stable across runs
+	run[-1, :n_entries] = order + first_entry
+	run.flush()
+	del run
+	return file_name, n_entries
+
+
+def less_equal(columns, bound):
+	"""lexicographic comparison of the columns of a (n_keys, n) array with a bound of n_keys values, NaN is larger than all numbers as in numpy.lexsort"""
+	less = numpy.zeros(columns.shape[1], dtype=numpy.bool_)
+	equal = numpy.ones(columns.shape[1], dtype=numpy.bool_)
+	for column, bound_value in zip(columns, bound):
+		if math.isnan(bound_value):
+			less |= equal & ~numpy.isnan(column)
+			equal &= numpy.isnan(column)
+		else:
+			less |= equal & (column < bound_value)
+			equal &= (column == bound_value)
+	return less | equal
+
+
+def merge_sorted_runs(runs, n_keys, file_name, max_memory):
+	"""
+	k-way merge of sorted runs written by write_sorted_run
+	at most max_memory bytes are used for the buffered entries of all runs
+	returns the sorted entry indices as memmap
+	"""
+	n_columns = n_keys + 1
+	n_entries = sum([n_run_entries for run_file, n_run_entries in runs])
+	# buffers of all runs, the entries merged in one step and their sorted copy
+	buffer_size = max(1, max_memory // (3 * 8 * n_columns * len(runs)))
+	
+	run_arrays = [numpy.memmap(run_file, dtype=numpy.double, mode="r", shape=(n_columns, max(n_run_entries, 1)))[:, :n_run_entries] for run_file, n_run_entries in runs]
+	positions = [0] * len(runs)
+	buffers = [numpy.empty((n_columns, 0), dtype=numpy.double) for run in runs]
+	sorted_entries = numpy.memmap(file_name, dtype=numpy.int64, mode="w+", shape=(max(n_entries, 1),))[:n_entries]
+	
+	n_sorted_entries = 0
+	while n_sorted_entries < n_entries:
+		for index, run_array in enumerate(run_arrays):
+			n_missing = min(buffer_size - buffers[index].shape[1], run_array.shape[1] - positions[index])
+			if n_missing > 0:
+				buffers[index] = numpy.concatenate([buffers[index], run_array[:, positions[index]:positions[index]+n_missing]], axis=1)
+				positions[index] += n_missing
+		
+		# all buffered entries up to the smallest last buffered entry of the runs
+		# that are not yet completely buffered are at their final position
+		bounds = [buffers[index][:, -1] for index, run_array in enumerate(run_arrays) if positions[index] < run_array.shape[1]]
+		merged_entries = []
+		for index, run_buffer in enumerate(buffers):
+			if len(bounds) > 0:
+				bound_array = numpy.array(bounds).T
+				selection = less_equal(run_buffer, bound_array[:, numpy.lexsort(bound_array[::-1])[0]])
+			else:
+				selection = numpy.ones(run_buffer.shape[1], dtype=numpy.bool_)
+			merged_entries.append(run_buffer[:, selection])
+			buffers[index] = run_buffer[:, ~selection]
+		merged_entries = numpy.concatenate(merged_entries, axis=1)
+		
+		n_merged_entries = merged_entries.shape[1]
+		sorted_entries[n_sorted_entries:n_sorted_entries+n_merged_entries] = merged_entries[-1, numpy.lexsort(merged_entries[::-1])]
+		n_sorted_entries += n_merged_entries
+	
+	sorted_entries.flush()
+	return sorted_entries
+
+
 def main():
 	
 	parser = argparse.ArgumentParser(description="Sort trees.",
@@ -32,6 +136,10 @@ def main():
 	                    help="Branch names to be considered for the sorting.")
 	parser.add_argument("-o", "--output", default="output.root",
 	                    help="Output ROOT file.")
+	parser.add_argument("-w", "--window-size", type=int, default=100000,
+	                    help="Number of sorted entries copied per window. The entries of a window are read in increasing order. [Default: %(default)s]")
+	parser.add_argument("--max-memory", type=int, default=2000,
+	                    help="Memory (in MB) for sorting. Larger trees are sorted in runs that are written to temporary files and merged afterwards. [Default: %(default)s]")
 	
 	args = parser.parse_args()
 	logger.initLogger(args)
@@ -49,27 +157,58 @@ def main():
 	input_tree.SetCacheSize(128*1024*1024)
 	n_entries = input_tree.GetEntries()
 	
-	values = [[] for index in xrange(len(args.branches))]
-	n_entries_per_iteration = 10000000 # larger buffers make problems
-	for iteration in progressiterator.ProgressIterator(range(int(math.ceil(n_entries / float(n_entries_per_iteration)))), description="Retrieving branch values for sorting"):
-		cut = "(Entry$>=({i}*{n}))*(Entry$<(({i}+1)*{n}))".format(i=iteration, n=n_entries_per_iteration)
-		input_tree.Draw(":".join(args.branches), cut, "goff")
-		buffers = [input_tree.GetV1(), input_tree.GetV2(), input_tree.GetV3(), input_tree.GetV4()][:len(args.branches)]
-		for index, input_buffer in enumerate(buffers):
-			values[index].extend(list(numpy.ndarray(input_tree.GetSelectedRows(), dtype=numpy.double, buffer=input_buffer)))
+	n_entries_per_draw = 10000000 # larger buffers make problems
+	max_memory = args.max_memory * 1024 * 1024
+	# sort keys, Draw buffers and the sorted copies of one run need to fit into the memory
+	n_entries_per_run = max(1, max_memory // (8 * (3 * len(args.branches) + 2)))
+	n_entries_per_draw = min(n_entries_per_draw, n_entries_per_run)
+	input_tree.SetEstimate(min(n_entries, n_entries_per_draw)+1)
 	
-	log.info("Sorting of the tree entry indices...")
-	values = zip(*([range(n_entries)]+values))
-	values.sort(key=lambda value: value[1:])
-	sorted_entries = list(zip(*values)[0])
+	tmp_directory = None
+	if n_entries <= n_entries_per_run:
+		log.info("Sorting of the tree entry indices...")
+		values = read_keys(input_tree, args.branches, 0, n_entries, n_entries_per_draw)
+		# lexsort is stable and uses the last key as primary key
+		sorted_entries = numpy.lexsort(values[::-1])
+		del values
+	else:
+		# external sort: sorted runs are written to temporary files and merged afterwards
+		tmp_directory = tempfile.mkdtemp(prefix="sort-trees_")
+		log.info("Sort keys exceed %d MB, sorting runs of %d entries in temporary directory %s." % (args.max_memory, n_entries_per_run, tmp_directory))
+		runs = []
+		for run_index, first_entry in enumerate(progressiterator.ProgressIterator(range(0, n_entries, n_entries_per_run), description="Sorting runs of tree entries")):
+			values = read_keys(input_tree, args.branches, first_entry, min(n_entries_per_run, n_entries-first_entry), n_entries_per_draw)
+			runs.append(write_sorted_run(values, first_entry, os.path.join(tmp_directory, "run%d" % run_index)))
+			del values
+		log.info("Merging %d sorted runs..." % len(runs))
+		sorted_entries = merge_sorted_runs(runs, len(args.branches), os.path.join(tmp_directory, "sorted_entries"), max_memory)
 	
 	log.info("Creating output "+args.output+"...")
 	with tfilecontextmanager.TFileContextManager(args.output, "RECREATE") as output_file:
 		output_tree = input_tree.CloneTree(0)
-		for entry in progressiterator.ProgressIterator(sorted_entries, description="Copying tree entries"):
-			input_tree.GetEntry(entry)
-			output_tree.Fill()
+		
+		# entries of one window are first read in increasing order into a tree in memory
+		# and then copied from there in the sorted order to the output tree
+		ROOT.gROOT.cd()
+		window_tree = input_tree.CloneTree(0)
+		output_file.cd()
+		
+		for window_start in progressiterator.ProgressIterator(range(0, n_entries, args.window_size), description="Copying tree entries"):
+			window_entries = numpy.array(sorted_entries[window_start:window_start+args.window_size], dtype=numpy.int64)
+			if numpy.all(window_entries[1:] > window_entries[:-1]):
+				ROOT.artusSortTreesCopyEntries(input_tree, output_tree, window_entries, len(window_entries))
+			else:
+				read_order = numpy.argsort(window_entries, kind="mergesort")
+				window_tree.Reset()
+				ROOT.artusSortTreesCopyEntries(input_tree, window_tree, numpy.ascontiguousarray(window_entries[read_order]), len(window_entries))
+				window_positions = numpy.empty(len(window_entries), dtype=numpy.int64)
+				window_positions[read_order] = numpy.arange(len(window_entries), dtype=numpy.int64)
+				ROOT.artusSortTreesCopyEntries(window_tree, output_tree, window_positions, len(window_entries))
 		output_file.Write()
+	
+	del sorted_entries
+	if not tmp_directory is None:
+		shutil.rmtree(tmp_directory)
 	log.info("Save sorted tree in "+os.path.join(args.output, args.tree)+".")
 
 if __name__ == "__main__":